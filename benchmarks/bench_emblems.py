@@ -0,0 +1,57 @@
+"""
+Cost of answering emblems for every entry of one large directory: building
+its tagged set from SQLite once, then one lookup per file.
+
+	python benchmarks/bench_emblems.py [files]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]
+
+from nautilus_tmsu_cache import NautilusTMSUTagCache # noqa: E402
+from nautilus_tmsu_commands import NautilusTMSUCommandTagged # noqa: E402
+from nautilus_tmsu_database import NautilusTMSUDatabase # noqa: E402
+
+
+def create_database(root: str, files: int) -> None:
+	os.mkdir(os.path.join(root, ".tmsu"))
+	connection = sqlite3.connect(os.path.join(root, ".tmsu", "db"))
+	connection.executescript("""
+		CREATE TABLE file (id INTEGER PRIMARY KEY, directory TEXT NOT NULL, name TEXT NOT NULL, fingerprint TEXT NOT NULL, mod_time DATETIME NOT NULL, size INTEGER NOT NULL, is_dir BOOLEAN NOT NULL);
+		CREATE TABLE file_tag (file_id INTEGER NOT NULL, tag_id INTEGER NOT NULL, value_id INTEGER NOT NULL);
+		CREATE INDEX idx_file_path ON file(directory, name);
+		CREATE INDEX idx_file_tag_file_id ON file_tag(file_id);
+	""")
+	# every file is known to the database, one in ten is still tagged
+	connection.executemany("INSERT INTO file VALUES (?, 'big', ?, '', '', 0, 0)", ((i, f"file{i}") for i in range(1, files + 1)))
+	connection.executemany("INSERT INTO file_tag VALUES (?, 1, 0)", ((i, ) for i in range(1, files + 1, 10)))
+	connection.commit()
+	connection.close()
+
+
+def main(files: int = 100000) -> None:
+	with tempfile.TemporaryDirectory() as root:
+		create_database(root, files)
+		directory = os.path.join(root, "big")
+		cache = NautilusTMSUTagCache()
+
+		start = time.perf_counter()
+		tagged = NautilusTMSUCommandTagged(directory, NautilusTMSUDatabase(root)).execute()
+		cache.set_tagged(directory, tagged)
+		built = time.perf_counter() - start
+
+		start = time.perf_counter()
+		count = sum(1 for i in range(1, files + 1) if cache.is_tagged(os.path.join(directory, f"file{i}")))
+		lookups = time.perf_counter() - start
+
+		print(f"{files} entries, {count} tagged")
+		print(f"tagged set: {built * 1000:.1f}ms, lookups: {lookups * 1000:.1f}ms ({lookups / files * 1e6:.2f}us per file)")
+
+
+if __name__ == "__main__":
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
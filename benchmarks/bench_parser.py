@@ -0,0 +1,97 @@
+"""
+Parse `tmsu tags -1 --name=always` output of many files with the streaming
+parser and with the split based code it replaced, and the output of one file
+at a time, as `tmsu tags -1 FILE` was parsed originally.
+
+	python benchmarks/bench_parser.py [files]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]
+
+from nautilus_tmsu_parser import NautilusTMSUTagParser # noqa: E402
+
+CHUNK = 65536
+
+
+def create_output(files: int) -> tuple[list[str], list[bytes]]:
+	paths = [f"/data/photos/2024/album {i // 100}/IMG_{i:06}.jpg" for i in range(files)]
+	sections = [f"{path.replace(' ', chr(92) + ' ')}:\nphoto\nyear=2024\nmy\\ tag\nplace=New\\ York\ncamera\n".encode("UTF-8") for path in paths]
+	return paths, sections
+
+
+def original(paths: list[str], sections: list[bytes]) -> dict[str, list[str]]:
+	# NautilusTMSUCommandTags.execute of the baseline, one invocation per file
+	tags = dict[str, list[str]]()
+	for path, stdout in zip(paths, sections):
+		tags[path] = stdout.decode("UTF-8").strip().split('\n')[1:]
+	return tags
+
+
+def streaming_per_file(paths: list[str], sections: list[bytes]) -> dict[str, list[str]]:
+	tags = dict[str, list[str]]()
+	for path, stdout in zip(paths, sections):
+		parser = NautilusTMSUTagParser(path)
+		tags[path] = [tag for record in parser.feed(stdout) + parser.close() for tag in record.tags]
+	return tags
+
+
+def split_based(paths: list[str], stdout: bytes) -> dict[str, list[str]]:
+	# NautilusTMSUCommandTagsBatch.parse before the parser module
+	output = stdout.decode("UTF-8")
+	tags = {path: list[str]() for path in paths}
+	current = None
+	for line in output.split("\n"):
+		if not line:
+			continue
+		if line.endswith(":") and not line.endswith("\\:"):
+			path = line[:-1]
+			current = path if path in tags else path.replace("\\", "")
+			tags.setdefault(current, [])
+		elif current is not None:
+			tags[current].append(line)
+	return tags
+
+
+def streaming(paths: list[str], stdout: bytes) -> dict[str, list[str]]:
+	tags = {path: list[str]() for path in paths}
+	parser = NautilusTMSUTagParser()
+	# fed the way the pipe delivers it
+	for start in range(0, len(stdout), CHUNK):
+		for record in parser.feed(stdout[start:start + CHUNK]):
+			tags.setdefault(record.path, []).extend(record.tags) # type: ignore
+	for record in parser.close():
+		tags.setdefault(record.path, []).extend(record.tags) # type: ignore
+	return tags
+
+
+def measure(function, paths: list[str], output, repeat: int = 20) -> float:
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function(paths, output)
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+def main(files: int = 20000) -> None:
+	paths, sections = create_output(files)
+	stdout = b"\n".join(sections)
+	assert streaming(paths, stdout) == split_based(paths, stdout)
+	assert streaming_per_file(paths, sections) == original(paths, sections)
+	print(f"{files} files, {len(stdout) / 1024:.0f} KiB of output")
+	for name, function, output in (
+		("original, one file at a time", original, sections),
+		("streaming parser, one file at a time", streaming_per_file, sections),
+		("split based, whole batch", split_based, stdout),
+		("streaming parser, whole batch", streaming, stdout),
+	):
+		seconds = measure(function, paths, output)
+		print(f"{name}: {seconds * 1000:.1f} ms ({seconds / files * 1e6:.2f} us per file)")
+
+
+if __name__ == "__main__":
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
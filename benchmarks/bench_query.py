@@ -0,0 +1,55 @@
+"""
+Time to first result and total time of a query matching every file of a
+synthetic database, read directly from SQLite.
+
+	python benchmarks/bench_query.py [files]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]
+
+from nautilus_tmsu_commands import NautilusTMSUCommandFiles # noqa: E402
+from nautilus_tmsu_database import NautilusTMSUDatabase # noqa: E402
+
+
+def create_database(root: str, files: int) -> None:
+	os.mkdir(os.path.join(root, ".tmsu"))
+	connection = sqlite3.connect(os.path.join(root, ".tmsu", "db"))
+	connection.executescript("""
+		CREATE TABLE tag (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+		CREATE TABLE file (id INTEGER PRIMARY KEY, directory TEXT NOT NULL, name TEXT NOT NULL, fingerprint TEXT NOT NULL, mod_time DATETIME NOT NULL, size INTEGER NOT NULL, is_dir BOOLEAN NOT NULL);
+		CREATE TABLE file_tag (file_id INTEGER NOT NULL, tag_id INTEGER NOT NULL, value_id INTEGER NOT NULL);
+		CREATE TABLE implication (tag_id INTEGER NOT NULL, value_id INTEGER NOT NULL, implied_tag_id INTEGER NOT NULL, implied_value_id INTEGER NOT NULL);
+		CREATE INDEX idx_file_tag_file_id ON file_tag(file_id);
+		CREATE INDEX idx_file_tag_tag_id ON file_tag(tag_id);
+		INSERT INTO tag VALUES (1, 'bench');
+	""")
+	connection.executemany("INSERT INTO file VALUES (?, ?, ?, '', '', 0, 0)", ((i, f"dir{i % 100}", f"file{i}") for i in range(1, files + 1)))
+	connection.executemany("INSERT INTO file_tag VALUES (?, 1, 0)", ((i, ) for i in range(1, files + 1)))
+	connection.commit()
+	connection.close()
+
+
+def main(files: int = 500000) -> None:
+	with tempfile.TemporaryDirectory() as root:
+		create_database(root, files)
+		first = []
+		start = time.perf_counter()
+
+		def on_results(command, paths):
+			if not first:
+				first.append(time.perf_counter() - start)
+
+		command = NautilusTMSUCommandFiles("bench", root, on_results, database=NautilusTMSUDatabase(root))
+		count = command.execute()
+		total = time.perf_counter() - start
+		print(f"{count} matches: first result after {first[0] * 1000:.2f} ms, all results after {total * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000)
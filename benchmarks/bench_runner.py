@@ -0,0 +1,50 @@
+"""
+Wall time of running many short tmsu commands through each runner backend.
+A shell script sleeping for `delay` seconds stands in for tmsu.
+
+	python benchmarks/bench_runner.py [commands] [delay]
+"""
+import os
+import queue
+import stat
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]
+
+from nautilus_tmsu_commands import NautilusTMSUCommand # noqa: E402
+from nautilus_tmsu_runner import NautilusTMSURunner # noqa: E402
+from nautilus_tmsu_runner_async import NautilusTMSUAsyncRunner # noqa: E402
+
+
+def run(runner: NautilusTMSURunner, tmsu: str, commands: int) -> float:
+	done = queue.Queue[None]()
+	# no main loop here, deliver results straight from the runner
+	runner.dispatcher = lambda callback, *args: callback(*args)
+	start = time.perf_counter()
+	for index in range(commands):
+		command = NautilusTMSUCommand("tags", str(index))
+		command._tmsu = tmsu
+		runner.add(command, lambda command, result: done.put(None))
+	for _ in range(commands):
+		done.get()
+	return time.perf_counter() - start
+
+
+def main(commands: int = 200, delay: float = 0.01) -> None:
+	with tempfile.TemporaryDirectory() as directory:
+		tmsu = os.path.join(directory, "tmsu")
+		with open(tmsu, "w") as script:
+			script.write(f"#!/bin/sh\nsleep {delay}\necho \"$@\"\n")
+		os.chmod(tmsu, os.stat(tmsu).st_mode | stat.S_IEXEC)
+
+		os.environ["NAUTILUS_TMSU_RUNNER_BACKEND"] = "thread"
+		for name, runner in (("thread", NautilusTMSURunner()), ("asyncio", NautilusTMSUAsyncRunner())):
+			elapsed = run(runner, tmsu, commands)
+			print(f"{name:8} {commands} commands in {elapsed * 1000:.0f} ms ({commands / elapsed:.0f} commands/s)")
+
+
+if __name__ == "__main__":
+	main(*[cast(arg) for cast, arg in zip((int, float), sys.argv[1:])])
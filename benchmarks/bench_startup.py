@@ -0,0 +1,42 @@
+"""
+Measure the cost of loading the extension the way Nautilus does at startup.
+
+Each sample imports `nautilus_tmsu` in a fresh interpreter against the mocks in
+tests/mocks so the numbers reflect only the extension's own work.
+
+	python benchmarks/bench_startup.py [samples]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE = (
+	"import sys, time\n"
+	"start = time.perf_counter()\n"
+	"import nautilus_tmsu\n"
+	"elapsed = time.perf_counter() - start\n"
+	"print(elapsed, len([m for m in sys.modules if m.startswith('nautilus_tmsu')]))\n"
+)
+
+
+def sample(env: dict[str, str]) -> tuple[float, int]:
+	result = subprocess.run([sys.executable, "-c", CODE], capture_output=True, env=env, check=True)
+	elapsed, modules = result.stdout.decode("UTF-8").split()[-2:]
+	return float(elapsed), int(modules)
+
+
+def main(samples: int = 20) -> None:
+	env = dict(os.environ, NAUTILUS_TMSU_DEBUG="WARNING", PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "src"), os.path.join(ROOT, "tests", "mocks")]))
+	timings = []
+	modules = 0
+	for _ in range(samples):
+		elapsed, modules = sample(env)
+		timings.append(elapsed * 1000)
+	print(f"import nautilus_tmsu: median {statistics.median(timings):.2f} ms, min {min(timings):.2f} ms over {samples} samples")
+	print(f"extension modules loaded at startup: {modules}")
+
+
+if __name__ == "__main__":
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,226 @@
+"""
+Tag large numbers of files from scripts, outside of Nautilus and without GTK
+
+	python -m nautilus_tmsu_bulk [--tag TAG]... [--manifest FILE] [--jobs N]
+
+Entries are read from the manifest, or stdin, one per line: a path, followed
+by a tab and the space separated tags for that path (escape spaces inside a
+tag with a backslash, as tmsu does). Tags given with --tag apply to every
+entry. Paths are grouped by database root and tag set and tagged with chunked
+`tmsu tag` invocations run in parallel through NautilusTMSURunner. tmsu holds
+a write transaction while tagging, so by default (--per-root 1) the chunks of
+one database run one after another and --jobs only helps with several
+databases.
+"""
+from __future__ import annotations
+
+import argparse
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+from typing import TextIO
+
+from nautilus_tmsu_commands import ARGS_BUDGET, NautilusTMSUCommand, NautilusTMSUCommandTag
+from nautilus_tmsu_runner import NautilusTMSURunner
+from nautilus_tmsu_runner_async import NautilusTMSUAsyncRunner
+from nautilus_tmsu_utils import find_database_root
+
+logger = logging.getLogger('nautilus-tmsu')
+
+NautilusTMSUBulkKey = tuple[str, tuple[str, ...]]
+
+
+def parse_manifest_line(line: str, tags: tuple[str, ...] = ()) -> tuple[str, tuple[str, ...]] | None:
+	"""
+	Path and tags of a manifest line, None for blank lines and comments
+	"""
+	line = line.rstrip('\r\n')
+	if not line.strip() or line.startswith('#'):
+		return None
+	path, _, line_tags = line.partition('\t')
+	all_tags = tags + tuple(tag for tag in _split_tags(line_tags) if tag not in tags)
+	return path, all_tags
+
+
+def _split_tags(text: str) -> list[str]:
+	tags = list[str]()
+	current = ''
+	escaped = False
+	for character in text:
+		if escaped:
+			current += character
+			escaped = False
+		elif character == '\\':
+			current += character
+			escaped = True
+		elif character == ' ':
+			if current:
+				tags.append(current)
+			current = ''
+		else:
+			current += character
+	if current:
+		tags.append(current)
+	return tags
+
+
+class NautilusTMSUBulkTagger(object):
+	"""
+	Groups incoming paths by database root and tag set and queues a `tmsu tag`
+	per chunk. At most `per_root` invocations run against one database at a
+	time since tmsu holds a write transaction while tagging; different roots
+	are tagged in parallel up to the runner's concurrency.
+	"""
+	def __init__(self, runner: NautilusTMSURunner, budget: int = ARGS_BUDGET, per_root: int = 1, max_queued: int = 64) -> None:
+		self._budget = budget
+		self._condition = threading.Condition()
+		self._groups = dict[NautilusTMSUBulkKey, list[str]]()
+		self._group_sizes = dict[NautilusTMSUBulkKey, int]()
+		self._max_queued = max_queued
+		self._per_root = per_root
+		self._queued = collections.defaultdict[str, collections.deque[tuple[list[str], tuple[str, ...]]]](collections.deque)
+		self._roots = dict[str, str | None]()
+		self._running = collections.Counter[str]()
+		self._runner = runner
+		self.chunks = 0
+		self.failed = list[tuple[str, str]]()
+		self.started = time.monotonic()
+		self.tagged = 0
+
+	@property
+	def throughput(self) -> float:
+		elapsed = time.monotonic() - self.started
+		return self.tagged / elapsed if elapsed > 0 else 0.0
+
+	def add(self, path: str, tags: tuple[str, ...]) -> None:
+		path = os.path.abspath(path)
+		if not tags:
+			self._fail([path], 'no tags')
+			return
+
+		directory = os.path.dirname(path)
+		if directory not in self._roots:
+			self._roots[directory] = find_database_root(directory)
+		root = self._roots[directory]
+		if root is None:
+			self._fail([path], 'not in a tmsu database')
+			return
+
+		key = (root, tuple(sorted(tags)))
+		size = len(path.encode('UTF-8', errors='surrogateescape')) + 1
+		if key in self._groups and self._group_sizes[key] + size > self._budget:
+			self._queue(key)
+		self._groups.setdefault(key, []).append(path)
+		self._group_sizes[key] = self._group_sizes.get(key, 0) + size
+
+	def finish(self, report: float | None = None, stream: TextIO = sys.stderr) -> None:
+		"""
+		Queue the remaining partial chunks and wait for every chunk, printing
+		progress every `report` seconds
+		"""
+		for key in list(self._groups):
+			self._queue(key)
+		reported = time.monotonic()
+		with self._condition:
+			while self._queued or self._running:
+				self._condition.wait(report)
+				if report and time.monotonic() - reported >= report:
+					self.report(stream)
+					reported = time.monotonic()
+
+	def report(self, stream: TextIO = sys.stderr) -> None:
+		stream.write(f"{self.tagged} tagged, {len(self.failed)} failed, {self.chunks} tmsu invocations, {self.throughput:.0f} files/s\n")
+		stream.flush()
+
+	def _fail(self, paths: list[str], reason: str) -> None:
+		with self._condition:
+			self.failed += [(path, reason) for path in paths]
+
+	def _on_tagged(self, command: NautilusTMSUCommand, result: str | None, root: str, paths: list[str]):
+		with self._condition:
+			self._running[root] -= 1
+			if not self._running[root]:
+				del self._running[root]
+			if result is None:
+				self.failed += [(path, 'tmsu tag failed') for path in paths]
+			else:
+				self.tagged += len(paths)
+			self._start(root)
+			self._condition.notify_all()
+		return False
+
+	def _queue(self, key: NautilusTMSUBulkKey) -> None:
+		root, tags = key
+		paths = self._groups.pop(key)
+		del self._group_sizes[key]
+		with self._condition:
+			# keep memory bounded when input arrives faster than tmsu tags it
+			while sum(len(chunks) for chunks in self._queued.values()) >= self._max_queued:
+				self._condition.wait()
+			self._queued[root].append((paths, tags))
+			self._start(root)
+
+	def _start(self, root: str) -> None:
+		# called with the condition held
+		chunks = self._queued.get(root)
+		while chunks and self._running[root] < self._per_root:
+			paths, tags = chunks.popleft()
+			self._running[root] += 1
+			self.chunks += 1
+			command = NautilusTMSUCommandTag(paths, list(tags), cwd=root)
+			self._runner.add(command, self._on_tagged, root, paths)
+		if chunks is not None and not chunks:
+			del self._queued[root]
+
+
+def main(argv: list[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(prog="python -m nautilus_tmsu_bulk", description=__doc__.strip().split('\n')[0])
+	parser.add_argument("--manifest", "-m", type=argparse.FileType("r", encoding="UTF-8", errors="surrogateescape"), default=sys.stdin, help="manifest to read instead of stdin")
+	parser.add_argument("--tag", "-t", action="append", default=[], help="tag applied to every entry, can be repeated")
+	parser.add_argument("--jobs", "-j", type=int, help="tmsu invocations running at once with the asyncio backend, default the number of CPUs; only different databases run in parallel unless --per-root is raised")
+	parser.add_argument("--per-root", type=int, default=1, help="tmsu invocations running at once against one database, default 1: a single database is tagged serially and --jobs has no effect on it")
+	parser.add_argument("--backend", choices=("thread", "asyncio"), default="asyncio", help="runner backend")
+	parser.add_argument("--failures", type=argparse.FileType("w", encoding="UTF-8", errors="surrogateescape"), help="write failed paths and reasons to this file")
+	parser.add_argument("--progress", type=float, default=5.0, help="seconds between progress reports, 0 to disable")
+	parser.add_argument("--verbose", "-v", action="store_true")
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(stream=sys.stderr, format="%(levelname)s - %(message)s")
+	logger.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
+	# backend and concurrency are handed to the runner, not set in the
+	# environment, where the tmsu children would inherit them
+	runner = NautilusTMSURunner(backend=args.backend)
+	if isinstance(runner, NautilusTMSUAsyncRunner):
+		runner.concurrency = max(1, args.jobs or os.cpu_count() or 4)
+	elif args.jobs is not None:
+		logger.warning("--jobs is ignored by the thread backend, it runs one tmsu invocation at a time")
+	# no main loop here, callbacks run on the runner's thread
+	runner.dispatcher = lambda callback, *callback_args: callback(*callback_args)
+
+	tagger = NautilusTMSUBulkTagger(runner, per_root=max(1, args.per_root))
+	tags = tuple(args.tag)
+	reported = time.monotonic()
+	for line in args.manifest:
+		entry = parse_manifest_line(line, tags)
+		if entry:
+			tagger.add(*entry)
+		if args.progress and time.monotonic() - reported >= args.progress:
+			tagger.report()
+			reported = time.monotonic()
+	tagger.finish(args.progress or None)
+
+	tagger.report()
+	if args.failures:
+		for path, reason in tagger.failed:
+			args.failures.write(f"{path}\t{reason}\n")
+		args.failures.close()
+	return 1 if tagger.failed else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+import weakref
+
+from collections.abc import Iterable
+from gi.repository import Nautilus # type: ignore
+
+from nautilus_tmsu_parser import split_tag
+from nautilus_tmsu_utils import format_tags
+
+logger = logging.getLogger('nautilus-tmsu')
+
+
+def _matches(tag: tuple[str, str | None], removed: list[tuple[str, str | None]]) -> bool:
+	return any(tag[0] == name and value in (None, tag[1]) for name, value in removed)
+
+
+class NautilusTMSUTagCacheEntry(object):
+	def __init__(self, tags: list[str], file_info: Nautilus.FileInfo | None = None) -> None:
+		self.tags = tags
+		self.timestamp = time.monotonic()
+		self._file_info = None
+		if file_info is not None:
+			try:
+				self._file_info = weakref.ref(file_info)
+			except TypeError:
+				pass
+
+	@property
+	def file_info(self) -> Nautilus.FileInfo | None:
+		return self._file_info() if self._file_info else None
+
+
+class NautilusTMSUTagCache(object):
+	"""
+	Tags per path as last seen by the column, so edits made through the
+	extension can update the column without running `tmsu tags` again. The
+	names of the tagged entries of a directory are kept per directory for
+	emblems, built with one query instead of a lookup per file.
+	"""
+	_instance: 'NautilusTMSUTagCache'
+	_lock = threading.Lock()
+
+	def __new__(cls, *args, **kwargs) -> 'NautilusTMSUTagCache':
+		if not hasattr(cls, '_instance') or not cls._instance:
+			with cls._lock:
+				if not hasattr(cls, '_instance') or not cls._instance:
+					cls._instance = super().__new__(cls, *args, **kwargs)
+		return cls._instance
+
+	def __init__(self, ttl: float = 30.0) -> None:
+		if hasattr(self, '_entries'):
+			return
+
+		self._entries = dict[str, NautilusTMSUTagCacheEntry]()
+		self._tagged = dict[str, tuple[float, set[str]]]()
+		self.ttl = ttl
+
+	def get(self, path: str, ttl: float | None = None) -> list[str] | None:
+		"""
+		Cached tags of `path`, entries older than `ttl` (the cache's default
+		when not given) are dropped
+		"""
+		with self._lock:
+			entry = self._entries.get(path)
+			if entry is None:
+				return None
+			if time.monotonic() - entry.timestamp > (self.ttl if ttl is None else ttl):
+				del self._entries[path]
+				return None
+			return list(entry.tags)
+
+	def is_tagged(self, path: str, ttl: float | None = None) -> bool | None:
+		"""
+		Whether `path` carries any tag according to the set of its directory,
+		None when that set is not known (anymore)
+		"""
+		directory, name = os.path.split(path)
+		with self._lock:
+			tagged = self._tagged.get(directory)
+			if tagged is None:
+				return None
+			if time.monotonic() - tagged[0] > (self.ttl if ttl is None else ttl):
+				del self._tagged[directory]
+				return None
+			return name in tagged[1]
+
+	def set(self, path: str, tags: list[str], file_info: Nautilus.FileInfo | None = None) -> None:
+		with self._lock:
+			self._entries[path] = NautilusTMSUTagCacheEntry(list(tags), file_info)
+			self._update_tagged(path, bool(tags))
+
+	def set_tagged(self, directory: str, names: Iterable[str]) -> None:
+		with self._lock:
+			self._tagged[directory] = (time.monotonic(), set(names))
+
+	def invalidate(self, path: str) -> None:
+		with self._lock:
+			self._entries.pop(path, None)
+			# tags were added or removed outside of the cache, rebuild the set
+			self._tagged.pop(os.path.dirname(path), None)
+
+	def remove_tags(self, path: str, tags: list[str], file_info: Nautilus.FileInfo | None = None) -> bool:
+		"""
+		Drop `tags` from the cached entry for `path` and refresh its column
+		value. A tag without a value drops every value of it. Returns False
+		when there was nothing cached to update.
+		"""
+		removed = [split_tag(tag) for tag in tags]
+		with self._lock:
+			entry = self._entries.get(path)
+			if entry is None:
+				return False
+			remaining = [tag for tag in entry.tags if not _matches(split_tag(tag), removed)]
+			self._entries[path] = NautilusTMSUTagCacheEntry(remaining, file_info or entry.file_info)
+			self._update_tagged(path, bool(remaining))
+		self._refresh(path)
+		return True
+
+	def discard_tags(self, root: str, tags: list[str]) -> None:
+		"""
+		Drop `tags` from every cached entry below `root`, used after tags are
+		deleted from a database
+		"""
+		prefix = root.rstrip('/') + '/'
+		removed = [split_tag(tag) for tag in tags]
+		with self._lock:
+			paths = [path for path, entry in self._entries.items() if path.startswith(prefix) and any(_matches(split_tag(tag), removed) for tag in entry.tags)]
+			# files of a set may have lost their last tag without being cached
+			for directory in [directory for directory in self._tagged if directory == root.rstrip('/') or directory.startswith(prefix)]:
+				del self._tagged[directory]
+		for path in paths:
+			self.remove_tags(path, tags)
+
+	def _refresh(self, path: str) -> None:
+		with self._lock:
+			entry = self._entries.get(path)
+		if entry is None or entry.file_info is None:
+			return
+		entry.file_info.add_string_attribute('tmsu_tags', format_tags(entry.tags))
+		entry.file_info.invalidate_extension_info()
+
+	def _update_tagged(self, path: str, tagged: bool) -> None:
+		# called with the lock held
+		directory, name = os.path.split(path)
+		if directory not in self._tagged:
+			return
+		if tagged:
+			self._tagged[directory][1].add(name)
+		else:
+			self._tagged[directory][1].discard(name)
@@ -0,0 +1,149 @@
+import logging
+
+from collections.abc import Callable
+from gi.repository import Nautilus # type: ignore
+from typing import Literal, NamedTuple
+
+from nautilus_tmsu_cache import NautilusTMSUTagCache
+from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandDelete, NautilusTMSUCommandUntag, chunk_files
+from nautilus_tmsu_runner import NautilusTMSURunner
+from nautilus_tmsu_utils import get_path_from_file_info
+
+logger = logging.getLogger('nautilus-tmsu')
+
+
+class NautilusTMSUChange(NamedTuple):
+	action: Literal["untag", "delete"]
+	file: Nautilus.FileInfo
+	tag: str
+	root: str | None = None
+
+
+NautilusTMSUChangeSetCallback = Callable[[list[NautilusTMSUChange]], None]
+
+
+class NautilusTMSUChangeSet(object):
+	"""
+	Tag removals staged by a dialog and committed as as few tmsu invocations
+	as possible: one untag per group of files sharing the same removed tags and
+	one delete per database.
+	"""
+	def __init__(self) -> None:
+		# insertion ordered set of the staged changes
+		self._changes = dict[NautilusTMSUChange, None]()
+		self._pending = 0
+		self._failed = list[NautilusTMSUChange]()
+		self._on_complete: NautilusTMSUChangeSetCallback | None = None
+
+	def __bool__(self) -> bool:
+		return bool(self._changes)
+
+	def __iter__(self):
+		return iter(self._changes)
+
+	def __len__(self) -> int:
+		return len(self._changes)
+
+	@property
+	def committing(self) -> bool:
+		return self._pending > 0
+
+	def clear(self) -> None:
+		self._changes.clear()
+
+	def delete(self, file_info: Nautilus.FileInfo, tag: str, root: str | None = None) -> NautilusTMSUChange:
+		return self._stage(NautilusTMSUChange("delete", file_info, tag, root))
+
+	def discard(self, change: NautilusTMSUChange) -> None:
+		self._changes.pop(change, None)
+
+	def untag(self, file_info: Nautilus.FileInfo, tag: str, root: str | None = None) -> NautilusTMSUChange:
+		return self._stage(NautilusTMSUChange("untag", file_info, tag, root))
+
+	def commands(self) -> list[tuple[NautilusTMSUCommand, list[NautilusTMSUChange]]]:
+		"""
+		Build the batched commands for the staged changes, each paired with the
+		changes it applies
+		"""
+		untag_by_file = dict[Nautilus.FileInfo, list[NautilusTMSUChange]]()
+		delete_by_cwd = dict[str, list[NautilusTMSUChange]]()
+		for change in self._changes:
+			if change.action == "untag":
+				untag_by_file.setdefault(change.file, []).append(change)
+			else:
+				delete_by_cwd.setdefault(change.root or get_path_from_file_info(change.file, True), []).append(change)
+
+		# files of one database losing exactly the same tags share one untag
+		untag_groups = dict[tuple[str, tuple[str, ...]], list[NautilusTMSUChange]]()
+		for file, changes in untag_by_file.items():
+			cwd = changes[0].root or get_path_from_file_info(file, True)
+			key = (cwd, tuple(sorted({change.tag for change in changes})))
+			untag_groups.setdefault(key, []).extend(changes)
+
+		commands = list[tuple[NautilusTMSUCommand, list[NautilusTMSUChange]]]()
+		for (cwd, untagged), changes in untag_groups.items():
+			files = list(dict.fromkeys(change.file for change in changes))
+			for chunk in chunk_files(files):
+				members = set(chunk)
+				commands.append((NautilusTMSUCommandUntag(chunk, list(untagged), cwd=cwd), [change for change in changes if change.file in members]))
+		for changes in delete_by_cwd.values():
+			deleted = list(dict.fromkeys(change.tag for change in changes))
+			commands.append((NautilusTMSUCommandDelete(changes[0].file, deleted), changes))
+		return commands
+
+	def commit(self, on_complete: NautilusTMSUChangeSetCallback | None = None) -> None:
+		"""
+		Queue the batched commands on the runner. `on_complete` is called on the
+		main loop once every command finished, with the changes that failed;
+		those are staged again so committing once more retries them.
+		"""
+		commands = self.commands()
+		self._changes = dict[NautilusTMSUChange, None]()
+		self._failed = list[NautilusTMSUChange]()
+		self._on_complete = on_complete
+		self._pending = len(commands)
+		if not commands:
+			self._finish()
+			return
+
+		runner = NautilusTMSURunner()
+		for command, changes in commands:
+			runner.add(command, self._on_command_complete, changes)
+
+	def _finish(self) -> None:
+		for change in self._failed:
+			self._stage(change)
+		if self._on_complete:
+			self._on_complete(self._failed)
+
+	def _on_command_complete(self, command: NautilusTMSUCommand, result: str | None, changes: list[NautilusTMSUChange]):
+		if result is None:
+			logger.error(f"failed to apply {len(changes)} tag change(s)")
+			self._failed += changes
+		else:
+			self._update_cache(changes)
+
+		self._pending -= 1
+		if self._pending == 0:
+			self._finish()
+		return False
+
+	def _stage(self, change: NautilusTMSUChange) -> NautilusTMSUChange:
+		self._changes[change] = None
+		return change
+
+	def _update_cache(self, changes: list[NautilusTMSUChange]) -> None:
+		cache = NautilusTMSUTagCache()
+		if changes[0].action == "delete":
+			root = changes[0].root or get_path_from_file_info(changes[0].file, True)
+			cache.discard_tags(root, [change.tag for change in changes])
+			return
+
+		removed = dict[Nautilus.FileInfo, list[str]]()
+		for change in changes:
+			removed.setdefault(change.file, []).append(change.tag)
+
+		for file, tags in removed.items():
+			if not cache.remove_tags(get_path_from_file_info(file), tags, file):
+				# nothing cached for this file, let the column query it again
+				file.invalidate_extension_info()
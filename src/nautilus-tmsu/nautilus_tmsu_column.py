@@ -1,18 +1,56 @@
+import collections
 import logging
-import queue
-import threading
+import os
+import time
 
 from gi.repository import GObject, Nautilus # type: ignore
-from urllib.parse import unquote
 
-from nautilus_tmsu_commands import NautilusTMSUCommandTags
-from nautilus_tmsu_runner import is_tmsu_db, NautilusTMSUCommand, NautilusTMSURunner
+from nautilus_tmsu_cache import NautilusTMSUTagCache
+from nautilus_tmsu_commands import chunk_files, NautilusTMSUCommandTagged, NautilusTMSUCommandTags, NautilusTMSUCommandTagsBatch, NautilusTMSUCommandTagsDirectory
+from nautilus_tmsu_config import get_option
+from nautilus_tmsu_policy import NautilusTMSURootPolicies, NautilusTMSURootPolicy
+from nautilus_tmsu_runner import find_tmsu_root, NautilusTMSUCommand, NautilusTMSUCommandRoots, NautilusTMSURunner
+from nautilus_tmsu_utils import format_tags, get_path_from_file_info
 
 GObject.threads_init()
 
 COLUMN_NAME = "NautilusTMSUColumn"
 logger = logging.getLogger("nautilus-tmsu")
 
+# files waiting for a shared command, by handle
+NautilusTMSUColumnWaiting = dict[Nautilus.OperationHandle, tuple[Nautilus.InfoProvider, GObject.Closure, Nautilus.FileInfo]]
+
+
+def look_up_tags(files: list[Nautilus.FileInfo]) -> None:
+	"""
+	Look up the tags of `files` on request and show them in the column, the
+	way tags of a root with the lazy strategy get there
+	"""
+	NautilusTMSURunner().add(NautilusTMSUCommandRoots(files), _on_look_up_roots)
+
+
+def _on_look_up_roots(command: NautilusTMSUCommand, roots: dict[str, list[Nautilus.FileInfo]]):
+	policies = NautilusTMSURootPolicies()
+	for root, files in roots.items():
+		for chunk in chunk_files(files):
+			NautilusTMSURunner().add(NautilusTMSUCommandTagsBatch(chunk, cwd=root), _on_looked_up, chunk, policies.get(root))
+	return False
+
+
+def _on_looked_up(command: NautilusTMSUCommand, result: dict[str, list[str]], files: list[Nautilus.FileInfo], policy: NautilusTMSURootPolicy):
+	if command.failed:
+		return False
+	# lets a lazy root pick a faster strategy again once lookups got quick
+	policy.record(command.elapsed, len(files))
+	cache = NautilusTMSUTagCache()
+	for file in files:
+		path = get_path_from_file_info(file)
+		tags = result.get(path, [])
+		cache.set(path, tags, file)
+		file.add_string_attribute('tmsu_tags', format_tags(tags))
+		file.invalidate_extension_info()
+	return False
+
 
 class NautilusTMSUTask(object):
 	closure: GObject.Closure
@@ -29,19 +67,49 @@ class NautilusTMSUTask(object):
 
 
 class NautilusTMSUColumn(GObject.GObject, Nautilus.ColumnProvider, Nautilus.InfoProvider):
+	"""
+	Tags column, and with `[column] mode = emblems` or `both` an emblem on
+	tagged files. Emblems are answered from the set of tagged names of the
+	directory, built with one query for the whole directory; `emblems` skips
+	the per file tag lookup entirely.
+
+	How tags are looked up follows the policy of the file's root: one command
+	per file, files of a root batched into few commands with the rest of their
+	directory prefetched, or only cached values until `look_up_tags` is asked
+	for. Lookups of single files and batches are timed per file to pick it,
+	a lazy root lets one file through now and then to be timed again.
+	"""
 	def __init__(self, **kwargs) -> None:
 		super().__init__(**kwargs)
 		self._active_handlers = dict[Nautilus.OperationHandle, NautilusTMSUCommand]()
+		self._cache = NautilusTMSUTagCache()
+		self._emblem = get_option('column', 'emblem', 'emblem-default')
+		self._mode = get_option('column', 'mode', 'tags')
+		self._policies = NautilusTMSURootPolicies()
 		self._runner = NautilusTMSURunner()
+		# files waiting for the tagged set of their directory
+		self._waiting = dict[str, NautilusTMSUColumnWaiting]()
+		# files waiting for a batch of their root, and the batches running
+		self._batched = dict[str, NautilusTMSUColumnWaiting]()
+		self._batches = list[NautilusTMSUColumnWaiting]()
+		self._batches_running = collections.Counter[str]()
+		# when the entries of a directory were last prefetched
+		self._prefetched = dict[str, float]()
 
 	def cancel_update(self, provider: Nautilus.InfoProvider, handle: Nautilus.OperationHandle | None = None) -> None:
 		logger.debug(f"cancelling handle: {handle}")
 		with NautilusTMSURunner.lock:
 			if handle in self._active_handlers:
-				self._active_handlers[handle].can_run = False
+				self._active_handlers[handle].cancel()
 				del self._active_handlers[handle]
+			# directory queries and batches are shared, only stop waiting for them
+			for waiting in [*self._waiting.values(), *self._batched.values(), *self._batches]:
+				waiting.pop(handle, None)
 
 	def get_columns(self) -> list[Nautilus.Column]:
+		if self._mode == "emblems":
+			# tags are never looked up in this mode, so there is no column to fill
+			return []
 		return [
 			Nautilus.Column(
 				name=f"{COLUMN_NAME}::tmsu_tags_column",
@@ -54,30 +122,190 @@ class NautilusTMSUColumn(GObject.GObject, Nautilus.ColumnProvider, Nautilus.Info
 	def update_file_info_full(self, provider: Nautilus.InfoProvider, handle: Nautilus.OperationHandle, closure: GObject.Closure, file: Nautilus.FileInfo):
 		logger.debug(f"update_file_info_full: {file.get_uri()}")
 
-		if file.get_uri_scheme() != "file" or not is_tmsu_db(file):
+		# runs on the main loop, the root is found without running tmsu
+		root = find_tmsu_root(file, log_error=False, run_tmsu=False) if file.get_uri_scheme() == "file" else None
+		if root is None:
 			logger.debug(f"skipping non tmsu file: {file.get_uri()}")
 			return Nautilus.OperationResult.COMPLETE
 
+		policy = self._policies.get(root)
+		# a lazy root still lets a file through now and then to time it again
+		lazy = policy.lazy and not policy.probe()
+		if self._mode in ("emblems", "both"):
+			return self._update_emblem(provider, handle, closure, file, policy, lazy)
+		return self._update_tags(provider, handle, closure, file, policy, lazy)
+
+	def _apply_tagged(self, provider: Nautilus.InfoProvider, handle: Nautilus.OperationHandle, closure: GObject.Closure, file: Nautilus.FileInfo, tagged: bool, policy: NautilusTMSURootPolicy, lazy: bool):
+		if not tagged:
+			return Nautilus.OperationResult.COMPLETE
+		file.add_emblem(self._emblem)
+		if self._mode == "both":
+			return self._update_tags(provider, handle, closure, file, policy, lazy)
+		return Nautilus.OperationResult.COMPLETE
+
+	def _batch(self, provider: Nautilus.InfoProvider, handle: Nautilus.OperationHandle, closure: GObject.Closure, file: Nautilus.FileInfo, policy: NautilusTMSURootPolicy):
+		with NautilusTMSURunner.lock:
+			self._batched.setdefault(policy.root, {})[handle] = (provider, closure, file)
+		self._start_batches(policy)
+		return Nautilus.OperationResult.IN_PROGRESS
+
+	def _start_batches(self, policy: NautilusTMSURootPolicy) -> None:
+		"""
+		Run the files waiting on `policy.root` in as few `tmsu tags` commands as
+		fit, without going over the root's concurrency. The first file of a
+		directory brings in the tags of its whole directory, so its siblings are
+		cached by the time Nautilus asks for them. Files arriving while those
+		run are collected into the next batch.
+		"""
+		batches = list[tuple[NautilusTMSUCommandTagsBatch, NautilusTMSUColumnWaiting]]()
+		now = time.monotonic()
+		with NautilusTMSURunner.lock:
+			waiting = self._batched.get(policy.root, {})
+			while waiting and (not policy.concurrency or self._batches_running[policy.root] < policy.concurrency):
+				items = list(waiting.items())
+				directory = os.path.dirname(get_path_from_file_info(items[0][1][2]))
+				prefetched = self._prefetched.get(directory)
+				command: NautilusTMSUCommandTagsBatch
+				if prefetched is None or now - prefetched > policy.ttl:
+					self._prefetched[directory] = now
+					batch = {handle: item for handle, item in items if os.path.dirname(get_path_from_file_info(item[2])) == directory}
+					command = NautilusTMSUCommandTagsDirectory(directory, cwd=policy.root)
+				else:
+					chunk = next(chunk_files([file for _, (_, _, file) in items]))
+					batch = dict(items[:len(chunk)])
+					command = NautilusTMSUCommandTagsBatch(chunk, cwd=policy.root)
+				for handle in batch:
+					del waiting[handle]
+				self._batches.append(batch)
+				self._batches_running[policy.root] += 1
+				batches.append((command, batch))
+			if not waiting:
+				self._batched.pop(policy.root, None)
+
+		for command, batch in batches:
+			logger.debug(f"added batch to queue: {policy.root} {len(batch)} files")
+			self._runner.add(command, self._update_batch, batch, policy)
+
+	def _update_batch(self, command: NautilusTMSUCommandTagsBatch, result: dict[str, list[str]], batch: NautilusTMSUColumnWaiting, policy: NautilusTMSURootPolicy):
+		logger.debug(f"_update_batch: {policy.root} {len(batch)} files")
+		with NautilusTMSURunner.lock:
+			self._batches.remove(batch)
+			self._batches_running[policy.root] -= 1
+			if not self._batches_running[policy.root]:
+				del self._batches_running[policy.root]
+			waiting = list(batch.items())
+			if not command.failed:
+				# files queued meanwhile that the batch answered, siblings of a prefetched directory
+				queued = self._batched.get(policy.root, {})
+				waiting += [(handle, queued.pop(handle)) for handle, (_, _, file) in list(queued.items()) if get_path_from_file_info(file) in result]
+
+		# a failed lookup is tried again next time instead of hiding the tags
+		if not command.failed:
+			policy.record(command.elapsed, len(command.paths))
+			files = {get_path_from_file_info(file): file for _, (_, _, file) in waiting}
+			for path, tags in result.items():
+				self._cache.set(path, tags, files.get(path))
+
+		requeued = NautilusTMSUColumnWaiting()
+		paths = set(command.paths)
+		for handle, (provider, closure, file) in waiting:
+			path = get_path_from_file_info(file)
+			tags = result.get(path, [])
+			if path not in paths and not command.failed:
+				# not listed when its directory was prefetched, left to the next batch
+				requeued[handle] = (provider, closure, file)
+				continue
+			if tags:
+				file.add_string_attribute('tmsu_tags', format_tags(tags))
+				file.invalidate_extension_info()
+			Nautilus.info_provider_update_complete_invoke(closure, provider, handle, Nautilus.OperationResult.COMPLETE)
+		if requeued:
+			with NautilusTMSURunner.lock:
+				self._batched.setdefault(policy.root, {}).update(requeued)
+		self._start_batches(policy)
+		return False
+
+	def _update_emblem(self, provider: Nautilus.InfoProvider, handle: Nautilus.OperationHandle, closure: GObject.Closure, file: Nautilus.FileInfo, policy: NautilusTMSURootPolicy, lazy: bool):
+		path = get_path_from_file_info(file)
+		tagged = self._cache.is_tagged(path, policy.ttl)
+		if tagged is None:
+			# tags looked up on request or prefetched answer it as well
+			tags = self._cache.get(path, policy.ttl)
+			tagged = None if tags is None else bool(tags)
+		if tagged is not None:
+			return self._apply_tagged(provider, handle, closure, file, tagged, policy, lazy)
+		if lazy:
+			return Nautilus.OperationResult.COMPLETE
+
+		directory = os.path.dirname(path)
+		with NautilusTMSURunner.lock:
+			waiting = self._waiting.get(directory)
+			if waiting is not None:
+				waiting[handle] = (provider, closure, file)
+				return Nautilus.OperationResult.IN_PROGRESS
+			self._waiting[directory] = {handle: (provider, closure, file)}
+
+		# deferred so sqlite3 is only loaded once emblems are looked up
+		from nautilus_tmsu_database import NautilusTMSUDatabase
+		self._runner.add(NautilusTMSUCommandTagged(directory, NautilusTMSUDatabase(policy.root)), self._update_emblems, directory, policy)
+		logger.debug(f"added to queue: {directory}")
+		return Nautilus.OperationResult.IN_PROGRESS
+
+	def _update_emblems(self, command: NautilusTMSUCommand, result: frozenset[str] | None, directory: str, policy: NautilusTMSURootPolicy):
+		logger.debug(f"_update_emblems: {directory} {len(result) if result is not None else None}")
+		with NautilusTMSURunner.lock:
+			waiting = self._waiting.pop(directory, {})
+
+		if result is not None:
+			self._cache.set_tagged(directory, result)
+		for handle, (provider, closure, file) in waiting.items():
+			tagged = result is not None and os.path.basename(get_path_from_file_info(file)) in result
+			# files only wait here once they got past the lazy check
+			if self._apply_tagged(provider, handle, closure, file, tagged, policy, False) != Nautilus.OperationResult.COMPLETE:
+				# the tags column completes it once the tags are in
+				continue
+			if tagged:
+				file.invalidate_extension_info()
+			Nautilus.info_provider_update_complete_invoke(closure, provider, handle, Nautilus.OperationResult.COMPLETE)
+		return False
+
+	def _update_tags(self, provider: Nautilus.InfoProvider, handle: Nautilus.OperationHandle, closure: GObject.Closure, file: Nautilus.FileInfo, policy: NautilusTMSURootPolicy, lazy: bool):
+		tags = self._cache.get(get_path_from_file_info(file), policy.ttl)
+		if tags is not None:
+			logger.debug(f"cached tags: {file.get_uri()}")
+			file.add_string_attribute('tmsu_tags', format_tags(tags))
+			return Nautilus.OperationResult.COMPLETE
+		if lazy:
+			return Nautilus.OperationResult.COMPLETE
+		if policy.batch:
+			return self._batch(provider, handle, closure, file, policy)
+
 		command = NautilusTMSUCommandTags(file)
 		with NautilusTMSURunner.lock:
 			self._active_handlers[handle] = command
 
-		self._runner.add(command, self._update_ui, provider, handle, closure, file)
+		self._runner.add(command, self._update_ui, provider, handle, closure, file, policy)
 		logger.debug(f"added to queue: {file.get_uri()}")
 		return Nautilus.OperationResult.IN_PROGRESS
 
-	def _update_ui(self, command: NautilusTMSUCommand, result: str | None, *args):
+	def _update_ui(self, command: NautilusTMSUCommand, result: list[str], *args):
 		file: Nautilus.FileInfo
-		[provider, handle, closure, file] = args
+		policy: NautilusTMSURootPolicy
+		[provider, handle, closure, file, policy] = args
 		logger.debug(f"_update_ui: {file.get_uri()} {result}")
 
 		if handle not in self._active_handlers:
-			logger.debug(f"handler missing, skipping _update_ui")
+			logger.debug("handler missing, skipping _update_ui")
 			return False
 
+		# a failed lookup is tried again next time instead of hiding the tags,
+		# and says nothing about how fast the root is
+		if not command.failed:
+			policy.record(command.elapsed)
+			self._cache.set(get_path_from_file_info(file), result, file)
 		if result:
-			file.add_string_attribute('tmsu_tags', ', '.join([tag.replace('\\', '') for tag in result]))
+			file.add_string_attribute('tmsu_tags', format_tags(result))
 			file.invalidate_extension_info()
-		logger.debug(f"_update_ui completed")
+		logger.debug("_update_ui completed")
 		Nautilus.info_provider_update_complete_invoke(closure, provider, handle, Nautilus.OperationResult.COMPLETE)
 		return False
@@ -1,25 +1,73 @@
+from __future__ import annotations
+
+import contextlib
+import io
 import logging
+import os
 import subprocess
+import time
+
+from collections.abc import AsyncGenerator, Callable, Generator, Iterable, Iterator
+from typing import IO, TYPE_CHECKING, Literal, cast
+
+from nautilus_tmsu_parser import NautilusTMSUTagParser, NautilusTMSUTagRecord, parse_tags
+from nautilus_tmsu_utils import get_path_from_file_info, low_priority_prefix, which_tmsu
 
-from collections.abc import Callable
-from gi.repository import Nautilus # type: ignore
-from typing import Literal
+if TYPE_CHECKING:
+	# asyncio is imported where the asyncio runner needs it, never at startup
+	import asyncio
 
-from nautilus_tmsu_utils import get_path_from_file_info, which_tmsu
+	from gi.repository import Nautilus # type: ignore
+	from nautilus_tmsu_database import NautilusTMSUDatabase
 
 logger = logging.getLogger('nautilus-tmsu')
-NautilusTMSUCommandCallback = Callable[["NautilusTMSUCommand", str | None], Literal[False]]
+# called with the command, its result and the extra arguments given to the runner
+NautilusTMSUCommandCallback = Callable[..., Literal[False]]
+NautilusTMSUCommandResultsCallback = Callable[["NautilusTMSUCommand", list[str]], None]
+
+# keep the paths passed to a single tmsu invocation well below ARG_MAX
+ARGS_BUDGET = 128 * 1024
+
+
+def chunk_files(files: list[Nautilus.FileInfo | str], budget: int = ARGS_BUDGET) -> Iterator[list[Nautilus.FileInfo | str]]:
+	chunk: list[Nautilus.FileInfo | str] = []
+	size = 0
+	for file in files:
+		length = len(get_path_from_file_info(file).encode('UTF-8')) + 1
+		if chunk and size + length > budget:
+			yield chunk
+			chunk, size = [], 0
+		chunk.append(file)
+		size += length
+	if chunk:
+		yield chunk
 
 
 class NautilusTMSUCommand(object):
-	_tmsu = which_tmsu()
+	# resolved on first use so importing the extension never touches $PATH
+	_tmsu: str | None = None
 
-	def __init__(self, *args, callback: NautilusTMSUCommandCallback | None = None, cwd: str | None = None, log_error: bool = True) -> None:
+	def __init__(self, *args, callback: NautilusTMSUCommandCallback | None = None, cwd: str | None = None, log_error: bool = True, low_priority: bool = False) -> None:
 		self._args = args
 		self._cwd = cwd
 		self._callback = callback
 		self._can_run = True
+		# seconds the runner spent executing the command
+		self.elapsed: float | None = None
+		# tmsu could not be run or exited with an error
+		self.failed = False
 		self._log_error = log_error
+		self._loop: asyncio.AbstractEventLoop | None = None
+		self._low_priority = low_priority
+		self._process: subprocess.Popen | asyncio.subprocess.Process | None = None
+
+	@property
+	def args(self) -> tuple[str, ...]:
+		"""
+		Full command line, run under nice/ionice for low priority commands
+		"""
+		prefix = low_priority_prefix() if self._low_priority else ()
+		return prefix + (self.tmsu, ) + self._args
 
 	@property
 	def callback(self):
@@ -35,30 +83,261 @@ class NautilusTMSUCommand(object):
 
 	@property
 	def tmsu(self):
+		if self._tmsu is None:
+			NautilusTMSUCommand._tmsu = which_tmsu()
 		return self._tmsu
 
 	@tmsu.setter
 	def tmsu(self, value):
 		self._tmsu = which_tmsu(value)
 
+	def cancel(self) -> None:
+		"""
+		Stop the command from running, terminating its child process when it
+		was started by the asyncio runner or reads its output incrementally
+		"""
+		self.can_run = False
+		process = self._process
+		if isinstance(process, subprocess.Popen):
+			if process.poll() is None:
+				process.terminate()
+		elif process is not None and self._loop is not None:
+			self._loop.call_soon_threadsafe(_terminate_async, process)
+
 	def execute(self):
-		args = (self.tmsu, ) + self._args
+		return self.parse(self._run())
 
+	async def execute_async(self):
+		"""
+		Same as `execute` for the asyncio runner, awaiting the child process
+		instead of blocking a thread on it
+		"""
 		try:
+			process = await self._start_async()
+			stdout, stderr = await process.communicate()
+		except Exception as e:
+			logger.error(e)
+			self.failed = True
+			return self.parse(None)
+		return self.parse(self._result(process.returncode, stdout, stderr))
+
+	def parse(self, output: str | None):
+		"""
+		Turn the output of a successful run (None on failure) into the result
+		handed to callbacks
+		"""
+		return output
+
+	def _result(self, returncode: int | None, stdout: bytes, stderr: bytes) -> str | None:
+		if returncode != 0:
+			self.failed = True
+			logger.log(9, f'command returned {returncode}: {stderr!r}')
+			if self._log_error and self.can_run:
+				error_message = stderr.decode('UTF-8')
+				logger.error(f'command failed: {error_message}')
+			return None
+
+		return stdout.decode('UTF-8')
+
+	def _run(self) -> str | None:
+		try:
+			args = self.args
 			logger.log(9, f'command: CWD={self._cwd} {" ".join(args)}')
 			result = subprocess.run(args, capture_output=True, cwd=self._cwd)
 		except Exception as e:
 			logger.error(e)
+			self.failed = True
 			return None
 
-		if result.returncode != 0:
-			logger.log(9, result)
-			if self._log_error:
-				error_message = result.stderr.decode('UTF-8')
-				logger.error(f'command failed: {error_message}')
-			return None
+		return self._result(result.returncode, result.stdout, result.stderr)
+
+	def _start(self) -> subprocess.Popen[bytes]:
+		args = self.args
+		logger.log(9, f'command: CWD={self._cwd} {" ".join(args)}')
+		process = self._process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self._cwd)
+		# cancelled before the process could be seen by `cancel`
+		if not self.can_run:
+			process.kill()
+		return process
+
+	async def _start_async(self) -> asyncio.subprocess.Process:
+		import asyncio
+		args = self.args
+		logger.log(9, f'command: CWD={self._cwd} {" ".join(args)}')
+		self._loop = asyncio.get_running_loop()
+		process = self._process = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self._cwd)
+		# cancelled before the process could be seen by `cancel`
+		if not self.can_run:
+			process.kill()
+		return process
+
+
+def _read_available(stdout: IO[bytes]) -> bytes:
+	"""
+	Whatever the pipe has right now, up to 64 KiB, instead of waiting for a
+	full buffer; Popen's pipes are BufferedReaders
+	"""
+	return cast(io.BufferedReader, stdout).read1(65536)
+
+
+def _terminate_async(process: asyncio.subprocess.Process) -> None:
+	if process.returncode is None:
+		try:
+			process.terminate()
+		except ProcessLookupError:
+			pass
+
+
+class NautilusTMSUCommandLines(NautilusTMSUCommand):
+	"""
+	Command reading its output line by line so it can be cancelled while the
+	child process is running. `parse_lines` gets the lines, or None when the
+	command failed or was cancelled.
+	"""
+	def execute(self):
+		try:
+			return self.parse_lines(list(self.lines()))
+		except Exception as e:
+			self.failed = True
+			if self.can_run:
+				logger.error(f'command failed: {e}')
+			return self.parse_lines(None)
+
+	async def execute_async(self):
+		try:
+			return self.parse_lines([line async for line in self.lines_async()])
+		except Exception as e:
+			self.failed = True
+			if self.can_run:
+				logger.error(f'command failed: {e}')
+			return self.parse_lines(None)
+
+	def lines(self) -> Generator[str, None, None]:
+		process = self._start()
+		assert process.stdout is not None and process.stderr is not None
+		try:
+			for line in process.stdout:
+				if not self.can_run:
+					break
+				yield line.decode('UTF-8', errors='surrogateescape').rstrip('\n')
+			if process.wait() != 0 or not self.can_run:
+				raise RuntimeError(process.stderr.read().decode('UTF-8').strip() or f'exit status {process.returncode}')
+		finally:
+			if process.poll() is None:
+				process.terminate()
+				process.wait()
+			process.stdout.close()
+			process.stderr.close()
+
+	async def lines_async(self) -> AsyncGenerator[str, None]:
+		process = await self._start_async()
+		assert process.stdout is not None and process.stderr is not None
+		try:
+			while line := await process.stdout.readline():
+				if not self.can_run:
+					break
+				yield line.decode('UTF-8', errors='surrogateescape').rstrip('\n')
+			if await process.wait() != 0 or not self.can_run:
+				raise RuntimeError((await process.stderr.read()).decode('UTF-8').strip() or f'exit status {process.returncode}')
+		finally:
+			if process.returncode is None:
+				_terminate_async(process)
+				await process.wait()
+
+	def parse_lines(self, lines: list[str] | None):
+		"""
+		Turn the output lines of a successful run (None on failure) into the
+		result handed to callbacks
+		"""
+		return lines
+
+
+class NautilusTMSUCommandTagRecords(NautilusTMSUCommand):
+	"""
+	Command printing `tmsu tags -1` output, parsed into tag records chunk by
+	chunk while it is read from the pipe. Subclasses build their result by
+	adding every record to `_empty_result()` with `_add_record` as it
+	arrives; a failed command gives the empty result.
+	"""
+	def collect(self, records: Iterable[NautilusTMSUTagRecord] | None):
+		result = self._empty_result()
+		if records is not None:
+			for record in records:
+				self._add_record(result, record)
+		return result
+
+	def execute(self):
+		try:
+			with contextlib.closing(self._records()) as records:
+				return self.collect(records)
+		except Exception as e:
+			self.failed = True
+			if self._log_error and self.can_run:
+				logger.error(f'command failed: {e}')
+			return self.collect(None)
+
+	async def execute_async(self):
+		result = self._empty_result()
+		try:
+			async with contextlib.aclosing(self._records_async()) as records:
+				async for record in records:
+					self._add_record(result, record)
+			return result
+		except Exception as e:
+			self.failed = True
+			if self._log_error and self.can_run:
+				logger.error(f'command failed: {e}')
+			return self.collect(None)
+
+	def parse(self, output: str | None):
+		return self.collect(None if output is None else parse_tags(output, self._records_path()))
+
+	def _add_record(self, result, record: NautilusTMSUTagRecord) -> None:
+		result.append(record)
 
-		return result.stdout.decode('UTF-8')
+	def _empty_result(self):
+		return list[NautilusTMSUTagRecord]()
+
+	def _records(self) -> Generator[NautilusTMSUTagRecord, None, None]:
+		process = self._start()
+		assert process.stdout is not None and process.stderr is not None
+		parser = NautilusTMSUTagParser(self._records_path())
+		try:
+			while chunk := _read_available(process.stdout):
+				yield from parser.feed(chunk)
+			yield from parser.close()
+			# tmsu fails as a whole when any path is missing, like `execute`
+			if process.wait() != 0 or not self.can_run:
+				raise RuntimeError(process.stderr.read().decode('UTF-8').strip() or f'exit status {process.returncode}')
+		finally:
+			if process.poll() is None:
+				process.terminate()
+				process.wait()
+			process.stdout.close()
+			process.stderr.close()
+
+	async def _records_async(self) -> AsyncGenerator[NautilusTMSUTagRecord, None]:
+		process = await self._start_async()
+		assert process.stdout is not None and process.stderr is not None
+		parser = NautilusTMSUTagParser(self._records_path())
+		try:
+			while chunk := await process.stdout.read(65536):
+				for record in parser.feed(chunk):
+					yield record
+			for record in parser.close():
+				yield record
+			if await process.wait() != 0 or not self.can_run:
+				raise RuntimeError((await process.stderr.read()).decode('UTF-8').strip() or f'exit status {process.returncode}')
+		finally:
+			if process.returncode is None:
+				_terminate_async(process)
+				await process.wait()
+
+	def _records_path(self) -> str | None:
+		"""
+		Path of records printed without a file name
+		"""
+		return None
 
 
 class NautilusTMSUCommandMixin(NautilusTMSUCommand):
@@ -67,7 +346,7 @@ class NautilusTMSUCommandMixin(NautilusTMSUCommand):
 
 
 class NautilusTMSUCommandFilesMixin(NautilusTMSUCommandMixin):
-	def __init__(self, *args, files: list[Nautilus.FileInfo], **kwargs) -> None:
+	def __init__(self, *args, files: list[Nautilus.FileInfo | str], **kwargs) -> None:
 		kwargs.setdefault('cwd', get_path_from_file_info(files[0], True))
 		for file in files:
 			args += (get_path_from_file_info(file), )
@@ -95,6 +374,145 @@ class NautilusTMSUCommandDelete(NautilusTMSUCommand):
 		super().__init__(cwd=cwd, *args)
 
 
+class NautilusTMSUCommandFiles(NautilusTMSUCommand):
+	"""
+	Stream the files matching a tmsu query. Batches of absolute paths are
+	passed to `on_results` from the runner thread while they are read, the
+	first one as soon as it is available. Simple tag queries are answered from
+	`database` when it is readable, anything else is read from the
+	`tmsu files` pipe.
+	"""
+	def __init__(self, query: str, cwd: str, on_results: NautilusTMSUCommandResultsCallback, limit: int | None = None, database: NautilusTMSUDatabase | None = None, batch_interval: float = 0.1) -> None:
+		super().__init__('files', '--print0', query, cwd=cwd)
+		self._batch_interval = batch_interval
+		self._database = database
+		self._limit = limit
+		self._on_results = on_results
+		self._query = query
+		self._batch = list[str]()
+		# the first batch goes out with the first result
+		self._delivered = 0.0
+		self.count = 0
+		self.truncated = False
+
+	def execute(self) -> int | None:
+		try:
+			with contextlib.closing(self._stream()) as paths:
+				for path in paths:
+					if not self._add_result(path):
+						break
+		except Exception as e:
+			logger.error(f'command failed: {e}')
+			return None
+		finally:
+			self._flush()
+		return self.count
+
+	async def execute_async(self) -> int | None:
+		import asyncio
+		if self._database_tags():
+			# sqlite reads block, keep them off the event loop
+			return await asyncio.to_thread(self.execute)
+
+		try:
+			async with contextlib.aclosing(self._read_pipe_async()) as paths:
+				async for path in paths:
+					if not self._add_result(path):
+						break
+		except Exception as e:
+			logger.error(f'command failed: {e}')
+			return None
+		finally:
+			self._flush()
+		return self.count
+
+	def _add_result(self, path: str) -> bool:
+		if not self.can_run:
+			return False
+		if self._limit and self.count >= self._limit:
+			# only a result past the limit means the list was cut off
+			self.truncated = True
+			return False
+		self._batch.append(path)
+		self.count += 1
+		now = time.monotonic()
+		if now - self._delivered >= self._batch_interval:
+			self._flush()
+			self._delivered = now
+		return True
+
+	def _database_tags(self) -> list[str] | None:
+		if self._database is None or not self._database.available:
+			return None
+		# deferred so sqlite3 stays off the startup path
+		from nautilus_tmsu_database import parse_simple_query
+		return parse_simple_query(self._query)
+
+	def _flush(self) -> None:
+		if self._batch and self.can_run:
+			self._on_results(self, self._batch)
+		self._batch = []
+
+	def _path(self, record: bytes) -> str:
+		return os.path.normpath(os.path.join(self._cwd or os.getcwd(), os.fsdecode(record)))
+
+	def _read_pipe(self) -> Generator[str, None, None]:
+		process = self._start()
+		assert process.stdout is not None and process.stderr is not None
+		pending = b''
+		try:
+			while chunk := _read_available(process.stdout):
+				records = (pending + chunk).split(b'\0')
+				pending = records.pop()
+				for record in records:
+					yield self._path(record)
+			if pending:
+				yield self._path(pending)
+			if process.wait() != 0 and self.can_run:
+				raise RuntimeError(process.stderr.read().decode('UTF-8').strip())
+		finally:
+			if process.poll() is None:
+				process.terminate()
+				process.wait()
+			process.stdout.close()
+			process.stderr.close()
+
+	async def _read_pipe_async(self) -> AsyncGenerator[str, None]:
+		process = await self._start_async()
+		assert process.stdout is not None and process.stderr is not None
+		pending = b''
+		try:
+			while chunk := await process.stdout.read(65536):
+				records = (pending + chunk).split(b'\0')
+				pending = records.pop()
+				for record in records:
+					yield self._path(record)
+			if pending:
+				yield self._path(pending)
+			if await process.wait() != 0 and self.can_run:
+				raise RuntimeError((await process.stderr.read()).decode('UTF-8').strip())
+		finally:
+			if process.returncode is None:
+				_terminate_async(process)
+				await process.wait()
+
+	def _stream(self) -> Generator[str, None, None]:
+		tags = self._database_tags()
+		if self._database and tags:
+			read = False
+			try:
+				for path in self._database.files(tags):
+					read = True
+					yield path
+				return
+			except Exception as e:
+				# only fall back while nothing was handed out yet
+				if read:
+					raise
+				logger.warning(f'unable to read {self._database.root} directly, using tmsu: {e}')
+		yield from self._read_pipe()
+
+
 class NautilusTMSUCommandInit(NautilusTMSUCommand):
 	def __init__(self, file_info: Nautilus.FileInfo) -> None:
 		cwd = get_path_from_file_info(file_info, True)
@@ -102,25 +520,162 @@ class NautilusTMSUCommandInit(NautilusTMSUCommand):
 		super().__init__(cwd=cwd, *args)
 
 
+class NautilusTMSUCommandRepair(NautilusTMSUCommandLines):
+	"""
+	Repair the database entries below `path`. Positional paths of `tmsu repair`
+	are where moved files are searched for, not what gets repaired, so the
+	repair is scoped with `--path` instead; it covers the whole tree below it.
+	"""
+	def __init__(self, path: str, cwd: str) -> None:
+		args = ['repair', f'--path={path}']
+		super().__init__(cwd=cwd, low_priority=True, *args)
+
+
+class NautilusTMSUCommandStatus(NautilusTMSUCommandLines):
+	"""
+	Entries below `paths` whose file changed or disappeared since tagging
+	"""
+	def __init__(self, paths: list[str], cwd: str) -> None:
+		args = ['status', ] + paths
+		super().__init__(cwd=cwd, low_priority=True, *args)
+
+	def parse_lines(self, lines: list[str] | None) -> dict[str, list[str]] | None:
+		if lines is None:
+			return None
+
+		findings = {'modified': list[str](), 'missing': list[str]()}
+		for line in lines:
+			status, _, path = line.partition(' ')
+			if status == 'M':
+				findings['modified'].append(os.path.normpath(os.path.join(self._cwd or '', path)))
+			elif status == '!':
+				findings['missing'].append(os.path.normpath(os.path.join(self._cwd or '', path)))
+		return findings
+
+
 class NautilusTMSUCommandTag(NautilusTMSUCommandRecursiveMixin, NautilusTMSUCommandTagsMixin, NautilusTMSUCommandFilesMixin):
-	def __init__(self, files: list[Nautilus.FileInfo], tags: list[str], recursive: bool = False) -> None:
+	def __init__(self, files: list[Nautilus.FileInfo | str], tags: list[str], recursive: bool = False, cwd: str | None = None) -> None:
 		args = ['tag', ]
-		super().__init__(files=files, tags=tags, recursive=recursive, *args)
+		super().__init__(files=files, tags=tags, recursive=recursive, *args, **({'cwd': cwd} if cwd else {}))
+
+
+class NautilusTMSUCommandTagged(NautilusTMSUCommand):
+	"""
+	Names of the tagged entries directly inside `directory`, read with one
+	query from `database` when it is readable, otherwise from
+	`tmsu files --path`
+	"""
+	def __init__(self, directory: str, database: NautilusTMSUDatabase | None = None) -> None:
+		directory = os.path.normpath(directory)
+		super().__init__('files', '--print0', f'--path={directory}', cwd=directory)
+		self._database = database
+		self._directory = directory
+
+	def execute(self) -> frozenset[str] | None:
+		if self._database is not None and self._database.available:
+			try:
+				return frozenset(self._database.tagged_names(self._directory))
+			except Exception as e:
+				logger.warning(f'unable to read {self._database.root} directly, using tmsu: {e}')
+		return super().execute()
+
+	async def execute_async(self) -> frozenset[str] | None:
+		import asyncio
+		if self._database is not None and self._database.available:
+			# sqlite reads block, keep them off the event loop
+			return await asyncio.to_thread(self.execute)
+		return await super().execute_async()
+
+	def parse(self, output: str | None) -> frozenset[str] | None:
+		if output is None:
+			return None
 
+		names = set[str]()
+		for record in output.split('\0'):
+			if not record:
+				continue
+			# --path includes subdirectories, only direct entries are wanted
+			path = os.path.normpath(os.path.join(self._directory, record))
+			if os.path.dirname(path) == self._directory:
+				names.add(os.path.basename(path))
+		return frozenset(names)
 
-class NautilusTMSUCommandTags(NautilusTMSUCommand):
+
+class NautilusTMSUCommandTags(NautilusTMSUCommandTagRecords):
 	def __init__(self, file: Nautilus.FileInfo, use_as_cwd: bool = False, cwd: str | None = None) -> None:
 		args = ['tags', '-1']
+		self._path = None
 		if not use_as_cwd:
-			args.append(get_path_from_file_info(file))
+			self._path = get_path_from_file_info(file)
+			args.append(self._path)
 		cwd = cwd if cwd and not use_as_cwd else get_path_from_file_info(file, True)
 		super().__init__(cwd=cwd, *args)
 
-	def execute(self) -> list[str]:
-		tags = super().execute()
-		if not tags:
-			return []
-		return tags.strip().split('\n')[1:]
+	def _add_record(self, result: list[str], record: NautilusTMSUTagRecord) -> None:
+		result.extend(record.tags)
+
+	def _empty_result(self) -> list[str]:
+		return []
+
+	def _records_path(self) -> str | None:
+		return self._path
+
+
+class NautilusTMSUCommandTagsBatch(NautilusTMSUCommandFilesMixin, NautilusTMSUCommandTagRecords):
+	"""
+	Tags of many files with a single `tmsu tags` invocation
+	"""
+	def __init__(self, files: list[Nautilus.FileInfo], cwd: str | None = None) -> None:
+		self._paths = [get_path_from_file_info(file) for file in files]
+		args = ['tags', '-1', '--name=always']
+		super().__init__(files=files, *args, **({'cwd': cwd} if cwd else {}))
+
+	@property
+	def paths(self) -> list[str]:
+		return self._paths
+
+	def _add_record(self, result: dict[str, list[str]], record: NautilusTMSUTagRecord) -> None:
+		if record.path is not None:
+			result.setdefault(record.path, []).extend(record.tags)
+
+	def _empty_result(self) -> dict[str, list[str]]:
+		return {path: list[str]() for path in self._paths}
+
+	def _records_path(self) -> str | None:
+		return self._paths[0] if len(self._paths) == 1 else None
+
+
+class NautilusTMSUCommandTagsDirectory(NautilusTMSUCommandTagsBatch):
+	"""
+	Tags of the entries directly inside `directory`, as many as fit a single
+	invocation. The directory is listed when the command runs, so a slow
+	filesystem is never listed on the main loop.
+	"""
+	def __init__(self, directory: str, cwd: str | None = None) -> None:
+		super().__init__([directory], cwd=cwd)
+		self._directory = directory
+
+	def execute(self) -> dict[str, list[str]]:
+		if not self._list():
+			return self.collect(None)
+		return super().execute()
+
+	async def execute_async(self) -> dict[str, list[str]]:
+		import asyncio
+		if not await asyncio.to_thread(self._list):
+			return self.collect(None)
+		return await super().execute_async()
+
+	def _list(self) -> bool:
+		try:
+			names = sorted(os.listdir(self._directory))
+		except OSError as e:
+			logger.debug(f'unable to list {self._directory}: {e}')
+			self.failed = True
+			names = []
+		self._paths = next(chunk_files([os.path.join(self._directory, name) for name in names]), [])
+		self._args = ('tags', '-1', '--name=always', *self._paths)
+		return bool(self._paths)
 
 
 class NautilusTMSUCommandUntag(NautilusTMSUCommandRecursiveMixin, NautilusTMSUCommandTagsMixin, NautilusTMSUCommandFilesMixin):
@@ -130,4 +685,6 @@ class NautilusTMSUCommandUntag(NautilusTMSUCommandRecursiveMixin, NautilusTMSUCo
 			args.append('--all')
 		elif tags is None:
 			raise ValueError('tags or force_all must be defined')
-		super().__init__(files=files, tags=tags, recursive=recursive, tmsu=tmsu, cwd=tmsu, *args)
\ No newline at end of file
+		super().__init__(files=files, tags=tags, recursive=recursive, *args, **({'cwd': cwd} if cwd else {}))
+		if tmsu != "tmsu":
+			self.tmsu = tmsu
\ No newline at end of file
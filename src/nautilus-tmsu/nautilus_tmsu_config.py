@@ -0,0 +1,36 @@
+import configparser
+import functools
+import logging
+import os
+
+logger = logging.getLogger('nautilus-tmsu')
+
+CONFIG_PATH = os.path.join(os.getenv("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "nautilus-tmsu", "config.ini")
+
+
+@functools.cache
+def load_config(path: str = CONFIG_PATH) -> configparser.ConfigParser:
+	"""
+	Read the optional INI configuration file, e.g.
+
+		[runner]
+		backend = asyncio
+		concurrency = 4
+	"""
+	config = configparser.ConfigParser(interpolation=None)
+	try:
+		config.read(path, encoding="UTF-8")
+	except configparser.Error as e:
+		logger.error(f"ignoring invalid configuration {path}: {e}")
+	return config
+
+
+def get_option(section: str, option: str, fallback: str | None = None) -> str | None:
+	"""
+	Value of `option` in `section`, the environment variable
+	NAUTILUS_TMSU_<SECTION>_<OPTION> takes precedence over the file
+	"""
+	value = os.getenv(f"NAUTILUS_TMSU_{section}_{option}".upper())
+	if value is not None:
+		return value
+	return load_config().get(section, option, fallback=fallback)
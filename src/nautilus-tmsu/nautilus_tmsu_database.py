@@ -0,0 +1,127 @@
+import logging
+import os
+import re
+
+from collections.abc import Iterator
+
+try:
+	import sqlite3
+except ImportError:
+	sqlite3 = None # type: ignore
+
+logger = logging.getLogger('nautilus-tmsu')
+
+# tag names of a query made only of tags joined by (implicit) `and`
+_SIMPLE_QUERY = re.compile(r"(?:\\.|[^\s()=<>!\\])+")
+_OPERATORS = {"and", "or", "not", "eq", "ne", "lt", "gt", "le", "ge"}
+
+
+def parse_simple_query(query: str) -> list[str] | None:
+	"""
+	Tag names of `query` when it only requires every listed tag, or None for
+	anything needing tmsu's own query engine (or, not, values, comparisons)
+	"""
+	words = re.findall(r"(?:\\.|\S)+", query)
+	if not words or any(_SIMPLE_QUERY.fullmatch(word) is None for word in words):
+		return None
+	tags = [word for word in words if word.lower() != "and"]
+	if not tags or any(tag.lower() in _OPERATORS for tag in tags):
+		return None
+	return [re.sub(r"\\(.)", r"\1", tag) for tag in tags]
+
+
+class NautilusTMSUDatabase(object):
+	"""
+	Read only access to the SQLite database of a TMSU root, used where a direct
+	read is cheaper than spawning tmsu. Anything unexpected raises
+	`sqlite3.Error` and callers fall back to the tmsu command.
+	"""
+	def __init__(self, root: str) -> None:
+		self._root = root
+		self._path = os.path.join(root, '.tmsu', 'db')
+
+	@property
+	def available(self) -> bool:
+		return sqlite3 is not None and os.path.isfile(self._path)
+
+	@property
+	def root(self) -> str:
+		return self._root
+
+	def connect(self) -> 'sqlite3.Connection':
+		return sqlite3.connect(f"file:{self._path}?mode=ro", uri=True, check_same_thread=False)
+
+	def entries(self, directory: str) -> set[str]:
+		"""
+		Names directly inside `directory` that have entries in the database,
+		including ones no longer present on disk
+		"""
+		entries = set[str]()
+		connection = self.connect()
+		try:
+			# entries inside the root are stored relative to it, others absolute
+			for key in {os.path.relpath(directory, self._root), os.path.normpath(directory)}:
+				for (name, ) in connection.execute("SELECT name FROM file WHERE directory = ?", (key, )):
+					entries.add(name)
+				# subdirectories known only from the entries below them
+				if key == '.':
+					prefix = ''
+					rows = connection.execute("SELECT DISTINCT directory FROM file WHERE directory NOT IN ('.', '') AND directory NOT LIKE '/%'")
+				else:
+					prefix = key.rstrip('/') + '/'
+					# every directory below prefix sorts between prefix and prefix with '/' bumped to '0'
+					rows = connection.execute("SELECT DISTINCT directory FROM file WHERE directory >= ? AND directory < ?", (prefix, prefix[:-1] + '0'))
+				for (below, ) in rows:
+					entries.add(below[len(prefix):].split('/')[0])
+		finally:
+			connection.close()
+		return entries
+
+	def files(self, tags: list[str], batch_size: int = 1000) -> Iterator[str]:
+		"""
+		Stream the absolute paths of the files carrying every tag in `tags`,
+		directly or through an implication. Implications that only apply to
+		one value of a tag aren't followed here, a database having any raises
+		`sqlite3.NotSupportedError` so tmsu answers the query instead.
+		"""
+		ctes = []
+		conditions = []
+		for index, _ in enumerate(tags):
+			ctes.append(
+				f"implying{index}(tag_id) AS ("
+				"SELECT id FROM tag WHERE name = ? "
+				f"UNION SELECT implication.tag_id FROM implication JOIN implying{index} ON implication.implied_tag_id = implying{index}.tag_id)"
+			)
+			# correlated so rows stream out instead of the match set being built first
+			conditions.append(f"EXISTS (SELECT 1 FROM file_tag WHERE file_tag.file_id = file.id AND file_tag.tag_id IN implying{index})")
+		sql = f"WITH RECURSIVE {', '.join(ctes)} SELECT directory, name FROM file WHERE {' AND '.join(conditions)}"
+
+		connection = self.connect()
+		try:
+			if connection.execute("SELECT 1 FROM implication WHERE value_id != 0 LIMIT 1").fetchone():
+				raise sqlite3.NotSupportedError("implications depending on a value")
+			cursor = connection.execute(sql, tags)
+			while True:
+				rows = cursor.fetchmany(batch_size)
+				if not rows:
+					break
+				for directory, name in rows:
+					yield os.path.normpath(os.path.join(self._root, directory, name))
+		finally:
+			connection.close()
+
+	def tagged_names(self, directory: str) -> set[str]:
+		"""
+		Names of the entries directly inside `directory` carrying at least one
+		tag, read with a single query
+		"""
+		relative = os.path.relpath(directory, self._root)
+		connection = self.connect()
+		try:
+			rows = connection.execute(
+				"SELECT name FROM file WHERE directory IN (?, ?) AND EXISTS (SELECT 1 FROM file_tag WHERE file_tag.file_id = file.id)",
+				(relative, os.path.normpath(directory))
+			)
+			return {name for (name, ) in rows}
+		finally:
+			connection.close()
@@ -1,18 +1,25 @@
 import gi
+import os
 import re
 import sys
 
 try:
 	gi.require_version("Adw", "1")
-	from gi.repository import Adw, Gio, Gtk, Nautilus # type: ignore
+	from gi.repository import Adw, Gio, GLib, Gtk, Nautilus, Pango # type: ignore
 except ValueError as e:
 	print(f"Error loading Adw 1: {e}")
 	sys.exit(1)
 
 from typing import Callable, List, TypeAlias
 
-from nautilus_tmsu_commands import NautilusTMSUCommandDelete, NautilusTMSUCommandTag, NautilusTMSUCommandTags, NautilusTMSUCommandUntag
-from nautilus_tmsu_runner import NautilusTMSURunner, find_tmsu_root
+from nautilus_tmsu_cache import NautilusTMSUTagCache
+from nautilus_tmsu_changeset import NautilusTMSUChange, NautilusTMSUChangeSet
+from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandFiles, NautilusTMSUCommandTag, NautilusTMSUCommandTags, NautilusTMSUCommandTagsBatch, chunk_files
+from nautilus_tmsu_database import NautilusTMSUDatabase
+from nautilus_tmsu_duplicates import NautilusTMSUCommandDuplicates, NautilusTMSUDuplicateGroup
+from nautilus_tmsu_maintenance import NautilusTMSUMaintenanceState
+from nautilus_tmsu_runner import NautilusTMSUCommandRoots, NautilusTMSURunner, find_tmsu_root
+from nautilus_tmsu_utils import format_tags, get_path_from_file_info
 
 TMSUCallback: TypeAlias = Callable[[str, str], None]
 
@@ -153,49 +160,105 @@ class NautilusTMSUAddDialog(NautilusTMSUDialog):
 	def _on_clicked_add_tags(self, button: Gtk.Button, entry: Gtk.Entry, switch: Gtk.Switch | None):
 		text = str(entry.get_text())
 		tags = re.findall(r"((?:\\ |[^ ])+)", text)
-		self._runner.add(NautilusTMSUCommandTag(self._files, tags, recursive=switch.get_active() if switch else False))
+		self._runner.add(NautilusTMSUCommandTag(self._files, tags, recursive=switch.get_active() if switch else False), self._on_tags_added, self._files)
 		self.destroy()
-		[file.invalidate_extension_info() for file in self._files]
+
+	@staticmethod
+	def _on_tags_added(command: NautilusTMSUCommand, result: str | None, files: List[Nautilus.FileInfo]):
+		# refresh once tagging finished, runners may complete commands out of order
+		cache = NautilusTMSUTagCache()
+		for file in files:
+			cache.invalidate(get_path_from_file_info(file))
+			file.invalidate_extension_info()
+		return False
 
 
 class NautilusTMSUEditTagListDialog(NautilusTMSUDialog):
-	def __init__(self, title, file_info: Nautilus.FileInfo, can_add_item: bool=False):
-		super().__init__(title, [file_info, ])
+	def __init__(self, title, files: List[Nautilus.FileInfo], can_add_item: bool=False):
+		super().__init__(title, files)
 
 		self._can_add_item = can_add_item
-		self._file_info = file_info
+		self._changes = NautilusTMSUChangeSet()
 		self.set_default_size(400, 500)
 
 		self._create_child_box()
 
 	@property
-	def delete_dialog_detail(self) -> str:
-		raise NotImplementedError()
+	def commit_dialog_detail(self) -> str | None:
+		"""
+		Detail of the confirmation shown once before committing, or None to
+		commit without asking
+		"""
+		return None
+
+	def create_header(self, vbox: Gtk.Box):
+		pass
 
-	def delete_existing_tag(self, file_info: Nautilus.FileInfo, tag: str, row: Adw.ActionRow, tag_listbox: Gtk.ListBox):
+	def delete_existing_tag(self, tag: str) -> List[NautilusTMSUChange]:
 		raise NotImplementedError()
 
-	def get_existing_tags(self):
+	def describe_tag(self, tag: str) -> str | None:
+		return None
+
+	def get_existing_tags(self) -> List[str] | None:
+		"""
+		Tags listed in the dialog, or None when they are looked up on the runner
+		and passed to `show_existing_tags` once known
+		"""
 		raise NotImplementedError()
 
 	def on_add_button_clicked(self, button: Gtk.Button):
-		dialog = NautilusTMSUAddDialog([self._file_info])
+		dialog = NautilusTMSUAddDialog(self._files)
 		dialog.set_transient_for(self)
 		dialog.present()
 
 	def on_delete_button_clicked(self, button: Gtk.Button, tag: str, row: Adw.ActionRow, tag_listbox: Gtk.ListBox):
+		# optimistic, a change that fails stays pending for the next Save
+		self.delete_existing_tag(tag)
+		row.set_visible(False)
+		self._update_status()
+
+	def on_commit_dialog_choose_finish(self, dialog: Gtk.AlertDialog, result: Gio.AsyncResult):
+		response = dialog.choose_finish(result)
+		if response == 0:
+			self._commit()
+
+	def on_save_button_clicked(self, button: Gtk.Button):
+		if not self._changes:
+			self.destroy()
+			return
+
+		detail = self.commit_dialog_detail
+		if detail is None:
+			self._commit()
+			return
+
 		dialog = Gtk.AlertDialog()
 		dialog.set_buttons(["OK", "Cancel"])
 		dialog.set_cancel_button(1)
 		dialog.set_default_button(0)
-		dialog.set_detail(self.delete_dialog_detail.format(tag=tag, file=self._file_info.get_uri()))
+		tags = list(dict.fromkeys(change.tag for change in self._changes))
+		dialog.set_detail(detail.format(count=len(tags), tags=format_tags(tags)))
 		dialog.set_message("Confirm Tag Deletion")
-		dialog.choose(self, None, self.on_delete_dialog_choose_finish, tag, row, tag_listbox)
+		dialog.choose(self, None, self.on_commit_dialog_choose_finish)
 
-	def on_delete_dialog_choose_finish(self, dialog: Gtk.AlertDialog, result: Gio.AsyncResult, tag: str, row: Adw.ActionRow, tag_listbox: Gtk.ListBox):
-		response = dialog.choose_finish(result)
-		if response == 0:
-			self._internal_delete_existing_tag(self._file_info, tag, row, tag_listbox)
+	def show_existing_tags(self, tags: List[str]):
+		for tag in tags:
+			row = Adw.ActionRow(title=format_tags([tag]), subtitle=self.describe_tag(tag) or "")
+			self._tag_listbox.append(row)
+			delete_button = Gtk.Button(icon_name="user-trash-symbolic")
+			delete_button.add_css_class("destructive-action")
+			delete_button.add_css_class("flat")
+			delete_button.add_css_class("pill")
+			row.add_suffix(delete_button)
+			delete_button.connect("clicked", self.on_delete_button_clicked, tag, row, self._tag_listbox)
+		self._update_status()
+
+	def _commit(self):
+		self._button_box.set_sensitive(False)
+		self._status.remove_css_class("error")
+		self._status.set_label(f"Applying {len(self._changes)} change{'' if len(self._changes) == 1 else 's'}...")
+		self._changes.commit(self._on_commit_complete)
 
 	def _create_child_box(self):
 		vbox = self.get_child()
@@ -204,9 +267,10 @@ class NautilusTMSUEditTagListDialog(NautilusTMSUDialog):
 		while child:
 			vbox.remove(child)
 			child = vbox.get_first_child()
+		self.create_header(vbox)
 		scroll_window = Gtk.ScrolledWindow(vexpand=True)
 		vbox.append(scroll_window)
-		tag_listbox = Gtk.ListBox(selection_mode=Gtk.SelectionMode.NONE)
+		self._tag_listbox = tag_listbox = Gtk.ListBox(selection_mode=Gtk.SelectionMode.NONE)
 		scroll_window.set_child(tag_listbox)
 		tag_listbox.add_css_class("boxed-list")
 
@@ -219,56 +283,388 @@ class NautilusTMSUEditTagListDialog(NautilusTMSUDialog):
 			add_button.connect("clicked", self.on_add_button_clicked)
 			row.set_child(add_button)
 
-		for tag in self.get_existing_tags():
-			row = Adw.ActionRow(title=tag.replace('\\ ', ' '))
-			tag_listbox.append(row)
-			delete_button = Gtk.Button(icon_name="user-trash-symbolic")
-			delete_button.add_css_class("destructive-action")
-			delete_button.add_css_class("flat")
-			delete_button.add_css_class("pill")
-			row.add_suffix(delete_button)
-			delete_button.connect("clicked", self.on_delete_button_clicked, tag, row, tag_listbox)
+		self._status = Gtk.Label(xalign=0)
+		vbox.append(self._status)
+
+		self._button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10, halign=Gtk.Align.CENTER, hexpand=True)
+		vbox.append(self._button_box)
+
+		save_button = Gtk.Button(label="Save")
+		self._button_box.append(save_button)
+		save_button.connect("clicked", self.on_save_button_clicked)
+
+		cancel_button = Gtk.Button(label="Cancel")
+		self._button_box.append(cancel_button)
+		cancel_button.connect("clicked", lambda btn: self.destroy())
 
 		self.set_child(vbox)
+		self.set_default_widget(save_button)
+
+		tags = self.get_existing_tags()
+		if tags is None:
+			self._status.set_label("Looking up tags...")
+		else:
+			self.show_existing_tags(tags)
 
-	def _internal_delete_existing_tag(self, file_info: Nautilus.FileInfo, tag: str, row: Adw.ActionRow, tag_listbox: Gtk.ListBox):
-		try:
-			self.delete_existing_tag(file_info, tag, row, tag_listbox)
-			tag_listbox.remove(row)
-		except:
-			pass
+	def _on_commit_complete(self, failed: list[NautilusTMSUChange]):
+		if not failed:
+			self.destroy()
+			return
+
+		# the changes tmsu rejected are staged again, their rows stay hidden until Save retries them or Cancel drops them
+		self._button_box.set_sensitive(True)
+		self._status.add_css_class("error")
+		self._status.set_label(f"Failed to apply {len(failed)} change{'' if len(failed) == 1 else 's'}, Save to try again, see the log for details")
+
+	def _update_status(self):
+		count = len(self._changes)
+		self._status.remove_css_class("error")
+		self._status.set_label(f"{count} pending change{'' if count == 1 else 's'}" if count else "")
 
 
 class NautilusTMSUEditDialog(NautilusTMSUEditTagListDialog):
-	def __init__(self, file: Nautilus.FileInfo):
-		super().__init__("TMSU Edit Tags", file, True)
+	def __init__(self, files: List[Nautilus.FileInfo]):
+		self._commands = list[NautilusTMSUCommand]()
+		self._roots = dict[Nautilus.FileInfo, str]()
+		self._runner = NautilusTMSURunner()
+		self._tagged = dict[str, List[Nautilus.FileInfo]]()
+		super().__init__("TMSU Edit Tags", files, True)
+		self.connect("destroy", self._on_destroy)
 
-	@property
-	def delete_dialog_detail(self):
-		return "Are you sure you want to remove the tag \"{tag}\" from the file {file}"
+	def delete_existing_tag(self, tag: str) -> List[NautilusTMSUChange]:
+		return [self._changes.untag(file, tag, self._roots.get(file)) for file in self._tagged.get(tag, [])]
 
-	def delete_existing_tag(self, file_info: Nautilus.FileInfo, tag: str, row: Adw.ActionRow, tag_listbox: Gtk.ListBox):
-		NautilusTMSUCommandUntag([file_info], [tag]).execute()
-		file_info.invalidate_extension_info()
+	def describe_tag(self, tag: str) -> str | None:
+		if self.is_single_item():
+			return None
+		count = len(self._tagged.get(tag, []))
+		if count == len(self._files):
+			return f"On all {count} files"
+		return f"On {count} of {len(self._files)} files"
 
 	def get_existing_tags(self):
-		tags = []
-		for file in self._files:
-			tags += NautilusTMSUCommandTags(file).execute()
-		return set(tags)
+		"""
+		Query the tags of every selected file with one `tmsu tags` per database
+		on the runner and count how many files carry each tag
+		"""
+		self._tagged.clear()
+		command = NautilusTMSUCommandRoots(self._files)
+		self._commands = [command]
+		self._runner.add(command, self._on_roots)
+		return None
+
+	def _on_destroy(self, window: Gtk.Window):
+		for command in self._commands:
+			command.cancel()
+
+	def _on_roots(self, command: NautilusTMSUCommand, groups: dict[str, List[Nautilus.FileInfo]]):
+		if not command.can_run:
+			return False
+
+		chunks = [(root, chunk) for root, files in groups.items() for chunk in chunk_files(files)]
+		self._commands = [NautilusTMSUCommandTagsBatch(chunk, cwd=root) for root, chunk in chunks]
+		if not self._commands:
+			self.show_existing_tags([])
+		for tags_command, (root, chunk) in zip(self._commands, chunks):
+			self._runner.add(tags_command, self._on_tags, root, chunk)
+		return False
+
+	def _on_tags(self, command: NautilusTMSUCommand, tags: dict[str, List[str]], root: str, files: List[Nautilus.FileInfo]):
+		if not command.can_run:
+			return False
+
+		cache = NautilusTMSUTagCache()
+		for file in files:
+			path = get_path_from_file_info(file)
+			self._roots[file] = root
+			file_tags = tags.get(path, [])
+			if not command.failed:
+				cache.set(path, file_tags, file)
+			for tag in file_tags:
+				self._tagged.setdefault(tag, []).append(file)
+
+		self._commands.remove(command)
+		if not self._commands:
+			# tags on every file first, then the ones on fewer files
+			self.show_existing_tags(sorted(self._tagged, key=lambda tag: (-len(self._tagged[tag]), tag)))
+		return False
 
 
 class NautilusTMSUManageDialog(NautilusTMSUEditTagListDialog):
 	def __init__(self, file: Nautilus.FileInfo):
 		self._cwd = find_tmsu_root(file)
-		super().__init__("TMSU Manage Tags", file)
+		super().__init__("TMSU Manage Tags", [file, ])
 
-	@property
-	def delete_dialog_detail(self):
-		return f"Are you sure you want to remove the tag \"{{tag}}\" from the database at {self._cwd}?"
+	# number of maintenance findings listed in the dialog
+	findings_limit = 50
 
-	def delete_existing_tag(self, file_info: Nautilus.FileInfo, tag: str, row: Adw.ActionRow, tag_listbox: Gtk.ListBox):
-		NautilusTMSUCommandDelete(file_info, [tag]).execute()
+	@property
+	def commit_dialog_detail(self):
+		return f"Are you sure you want to remove {{count}} tag(s) ({{tags}}) from the database at {self._cwd}?"
+
+	def create_header(self, vbox: Gtk.Box):
+		if not self._cwd:
+			return
+
+		maintenance = NautilusTMSURunner().maintenance
+		maintenance_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10, hexpand=True)
+		vbox.append(maintenance_box)
+		self._maintenance_status = Gtk.Label(xalign=0, hexpand=True, wrap=True)
+		maintenance_box.append(self._maintenance_status)
+		self._repair_button = Gtk.Button(label="Repair")
+		self._repair_button.set_tooltip_text("Update moved and modified files in the database the next time Nautilus is idle")
+		self._repair_button.connect("clicked", lambda button: maintenance.request_repair(self._cwd))
+		maintenance_box.append(self._repair_button)
+
+		self._findings = Gtk.Label(xalign=0, selectable=True, wrap=True)
+		expander = Gtk.Expander(label="Findings", child=self._findings)
+		vbox.append(expander)
+
+		maintenance.add_listener(self._on_maintenance_changed)
+		# Cancel and a successful commit destroy the window without a close request
+		self.connect("destroy", lambda window: maintenance.remove_listener(self._on_maintenance_changed))
+		self._on_maintenance_changed(maintenance.watch(self._cwd))
+
+	def _on_maintenance_changed(self, state: NautilusTMSUMaintenanceState):
+		if state.root != self._cwd:
+			return
+
+		self._maintenance_status.set_label(state.summary)
+		self._repair_button.set_sensitive(not state.repair_requested)
+		lines = [f"modified: {path}" for path in state.findings['modified']]
+		lines += [f"missing: {path}" for path in state.findings['missing']]
+		lines += [f"repaired: {line}" for line in state.findings['repaired']]
+		if len(lines) > self.findings_limit:
+			lines = lines[:self.findings_limit] + [f"... and {len(lines) - self.findings_limit} more"]
+		self._findings.set_label("\n".join(lines) or "Nothing found")
+
+	def delete_existing_tag(self, tag: str) -> List[NautilusTMSUChange]:
+		return [self._changes.delete(self._files[0], tag, self._cwd)]
 
 	def get_existing_tags(self):
 		return NautilusTMSUCommandTags(self._files[0], True, cwd=self._cwd).execute()
+
+
+class NautilusTMSUQueryDialog(NautilusTMSUDialog):
+	# keep the list usable for queries matching a large part of the database
+	result_limit = 10000
+
+	def __init__(self, file: Nautilus.FileInfo):
+		super().__init__("TMSU Find by Tags", [file, ])
+		self._command: NautilusTMSUCommandFiles | None = None
+		self._cwd = find_tmsu_root(file)
+		self._runner = NautilusTMSURunner()
+		self._store = Gio.ListStore(item_type=Gtk.StringObject)
+
+		self.set_default_size(600, 500)
+
+		vbox = self.get_child()
+		assert isinstance(vbox, Gtk.Box)
+		search_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10, hexpand=True)
+		vbox.append(search_box)
+		entry = Gtk.Entry(activates_default=True, hexpand=True, placeholder_text="Query, e.g. music and not rock")
+		search_box.append(entry)
+		search_button = Gtk.Button(label="Find")
+		search_box.append(search_button)
+		search_button.connect("clicked", self._on_clicked_find, entry)
+
+		self._status = Gtk.Label(xalign=0)
+		vbox.append(self._status)
+
+		factory = Gtk.SignalListItemFactory()
+		factory.connect("setup", lambda factory, item: item.set_child(Gtk.Label(xalign=0, ellipsize=Pango.EllipsizeMode.START)))
+		factory.connect("bind", lambda factory, item: item.get_child().set_label(item.get_item().get_string()))
+		list_view = Gtk.ListView(model=Gtk.NoSelection(model=self._store), factory=factory, single_click_activate=False)
+		list_view.connect("activate", self._on_activate_result)
+		scroll_window = Gtk.ScrolledWindow(vexpand=True)
+		scroll_window.set_child(list_view)
+		vbox.append(scroll_window)
+
+		self.connect("close-request", self._on_close_request)
+		self.set_default_widget(search_button)
+
+	def _on_activate_result(self, list_view: Gtk.ListView, position: int):
+		item = self._store.get_item(position)
+		if item:
+			Gio.AppInfo.launch_default_for_uri(Gio.File.new_for_path(item.get_string()).get_uri(), None)
+
+	def _on_clicked_find(self, button: Gtk.Button, entry: Gtk.Entry):
+		query = str(entry.get_text()).strip()
+		if not query or not self._cwd:
+			return
+
+		if self._command:
+			self._command.cancel()
+		self._store.remove_all()
+		self._status.remove_css_class("error")
+		self._status.set_label("Searching...")
+		self._command = NautilusTMSUCommandFiles(query, self._cwd, self._on_results, limit=self.result_limit, database=NautilusTMSUDatabase(self._cwd))
+		# the user waits for the first hits, never behind maintenance or duplicates
+		self._runner.add(self._command, self._on_find_complete)
+
+	def _on_close_request(self, window: Gtk.Window):
+		if self._command:
+			self._command.cancel()
+		return False
+
+	def _on_find_complete(self, command: NautilusTMSUCommand, result: int | None):
+		if command is not self._command:
+			return False
+
+		assert isinstance(command, NautilusTMSUCommandFiles)
+		if result is None:
+			self._status.add_css_class("error")
+			self._status.set_label("Query failed, see the log for details")
+		elif command.truncated:
+			self._status.set_label(f"Showing the first {result} files")
+		else:
+			self._status.set_label(f"{result} file{'' if result == 1 else 's'}")
+		return False
+
+	def _on_results(self, command: NautilusTMSUCommand, paths: List[str]):
+		# called from the runner thread, the store is only touched on the main loop
+		GLib.idle_add(self._append_results, command, paths)
+
+	def _append_results(self, command: NautilusTMSUCommand, paths: List[str]):
+		if command is self._command:
+			self._store.splice(self._store.get_n_items(), 0, [Gtk.StringObject.new(path) for path in paths])
+			self._status.set_label(f"{self._store.get_n_items()} files so far...")
+		return False
+
+
+class NautilusTMSUDuplicatesDialog(NautilusTMSUDialog):
+	def __init__(self, files: List[Nautilus.FileInfo]):
+		super().__init__("TMSU Find Duplicates", files)
+		self._groups = list[NautilusTMSUDuplicateGroup]()
+		self._runner = NautilusTMSURunner()
+		self._selected = set[int]()
+		# chunks of `tmsu tag` still running, files tagged, failed and outside of a database
+		self._tag_pending = 0
+		self._tag_counts = {'tagged': 0, 'failed': 0, 'outside': 0}
+
+		self.set_default_size(700, 550)
+
+		vbox = self.get_child()
+		assert isinstance(vbox, Gtk.Box)
+		self._status = Gtk.Label(xalign=0, label="Looking for duplicates...")
+		vbox.append(self._status)
+
+		self._group_listbox = Gtk.ListBox(selection_mode=Gtk.SelectionMode.NONE)
+		self._group_listbox.add_css_class("boxed-list")
+		scroll_window = Gtk.ScrolledWindow(vexpand=True)
+		scroll_window.set_child(self._group_listbox)
+		vbox.append(scroll_window)
+
+		tag_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10, hexpand=True)
+		vbox.append(tag_box)
+		self._tag_entry = Gtk.Entry(activates_default=True, hexpand=True, placeholder_text="Tags for every file of the selected groups")
+		tag_box.append(self._tag_entry)
+		self._tag_button = Gtk.Button(label="Tag Selected", sensitive=False)
+		self._tag_button.connect("clicked", self._on_clicked_tag)
+		tag_box.append(self._tag_button)
+
+		self.connect("close-request", self._on_close_request)
+		self.set_default_widget(self._tag_button)
+
+		# reading files can take long, it never holds up the column or other dialogs
+		self._command = NautilusTMSUCommandDuplicates([get_path_from_file_info(file) for file in files], self._on_results)
+		self._runner.add(self._command, self._on_search_complete, priority="duplicates")
+
+	def _append_groups(self, command: NautilusTMSUCommand, groups: List[NautilusTMSUDuplicateGroup]):
+		if command is not self._command:
+			return False
+
+		for size, paths in groups:
+			index = len(self._groups)
+			self._groups.append((size, paths))
+			row = Adw.ExpanderRow(title=GLib.markup_escape_text(f"{len(paths)} copies of {os.path.basename(paths[0])}"), subtitle=GLib.format_size(size))
+			check = Gtk.CheckButton(valign=Gtk.Align.CENTER)
+			check.connect("toggled", self._on_group_toggled, index)
+			row.add_prefix(check)
+			for path in paths:
+				file_row = Adw.ActionRow(title=GLib.markup_escape_text(path), activatable=True)
+				file_row.connect("activated", self._on_activate_file, path)
+				row.add_row(file_row)
+			self._group_listbox.append(row)
+		self._status.set_label(f"{len(self._groups)} groups so far...")
+		return False
+
+	def _on_activate_file(self, row: Adw.ActionRow, path: str):
+		Gio.AppInfo.launch_default_for_uri(Gio.File.new_for_path(path).get_uri(), None)
+
+	def _on_clicked_tag(self, button: Gtk.Button):
+		tags = re.findall(r"((?:\\ |[^ ])+)", str(self._tag_entry.get_text()))
+		if not tags or not self._selected:
+			return
+
+		paths = [path for index in sorted(self._selected) for path in self._groups[index][1]]
+		# the database of every directory is looked up with tmsu, off the main loop
+		self._runner.add(NautilusTMSUCommandRoots(paths), self._on_roots, paths, tags)
+		if not self._tag_pending:
+			self._tag_counts = {'tagged': 0, 'failed': 0, 'outside': 0}
+		self._status.remove_css_class("error")
+		self._status.set_label(f"Tagging {len(paths)} files...")
+
+	def _on_close_request(self, window: Gtk.Window):
+		self._command.cancel()
+		return False
+
+	def _on_group_toggled(self, check: Gtk.CheckButton, index: int):
+		if check.get_active():
+			self._selected.add(index)
+		else:
+			self._selected.discard(index)
+		self._tag_button.set_sensitive(bool(self._selected))
+
+	def _on_results(self, command: NautilusTMSUCommand, groups: List[NautilusTMSUDuplicateGroup]):
+		# called from the runner thread, widgets are only touched on the main loop
+		GLib.idle_add(self._append_groups, command, groups)
+
+	def _on_roots(self, command: NautilusTMSUCommand, groups: dict[str, List[str]], paths: List[str], tags: List[str]):
+		self._tag_counts['outside'] += len(paths) - sum(len(root_paths) for root_paths in groups.values())
+		for root, root_paths in groups.items():
+			for chunk in chunk_files(root_paths):
+				self._tag_pending += 1
+				self._runner.add(NautilusTMSUCommandTag(chunk, tags, cwd=root), self._on_tags_added, chunk)
+		self._show_tagging()
+		return False
+
+	def _on_search_complete(self, command: NautilusTMSUCommand, result: int | None):
+		if command is not self._command:
+			return False
+
+		if result is None:
+			if command.can_run:
+				self._status.add_css_class("error")
+				self._status.set_label("Looking for duplicates failed, see the log for details")
+			return False
+		self._status.set_label(f"{result} group{'' if result == 1 else 's'} of duplicates, {self._command.hashed} files read, {self._command.cached} known from earlier runs")
+		return False
+
+	def _on_tags_added(self, command: NautilusTMSUCommand, result: str | None, paths: List[str]):
+		self._tag_pending -= 1
+		cache = NautilusTMSUTagCache()
+		for path in paths:
+			cache.invalidate(path)
+		if result is None:
+			self._tag_counts['failed'] += len(paths)
+		else:
+			self._tag_counts['tagged'] += len(paths)
+			# the files may be shown in Nautilus, their tags and emblems are looked up again
+			for path in paths:
+				Nautilus.FileInfo.create_for_uri(Gio.File.new_for_path(path).get_uri()).invalidate_extension_info()
+		self._show_tagging()
+		return False
+
+	def _show_tagging(self) -> None:
+		counts = self._tag_counts
+		if self._tag_pending:
+			label = f"Tagging, {counts['tagged'] + counts['failed']} files done..."
+		else:
+			label = f"Tagged {counts['tagged']} file{'' if counts['tagged'] == 1 else 's'}"
+		if counts['outside']:
+			label += f", {counts['outside']} outside of a TMSU database"
+		if counts['failed']:
+			self._status.add_css_class("error")
+			label += f", {counts['failed']} failed, see the log for details"
+		self._status.set_label(label)
@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import stat
+import time
+
+from collections.abc import Callable, Iterator, Set
+
+try:
+	import sqlite3
+except ImportError:
+	sqlite3 = None # type: ignore
+
+from nautilus_tmsu_commands import NautilusTMSUCommand
+
+logger = logging.getLogger('nautilus-tmsu')
+
+CACHE_PATH = os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "nautilus-tmsu", "fingerprints.db")
+
+# size and paths of files with identical contents
+NautilusTMSUDuplicateGroup = tuple[int, list[str]]
+NautilusTMSUDuplicatesCallback = Callable[["NautilusTMSUCommandDuplicates", list[NautilusTMSUDuplicateGroup]], None]
+
+
+class NautilusTMSUFingerprintCache(object):
+	"""
+	Fingerprints of file contents keyed by path, size and modification time,
+	kept in SQLite below $XDG_CACHE_HOME so a file is only read again once it
+	changed. Without sqlite3 nothing is remembered.
+	"""
+	# rows written before they are committed
+	commit_interval = 500
+
+	def __init__(self, path: str = CACHE_PATH) -> None:
+		self._connection: 'sqlite3.Connection | None' = None
+		self._path = path
+		self._pending = 0
+
+	def __enter__(self) -> 'NautilusTMSUFingerprintCache':
+		if sqlite3 is None:
+			return self
+		try:
+			os.makedirs(os.path.dirname(self._path), exist_ok=True)
+			self._connection = sqlite3.connect(self._path)
+			self._connection.execute("CREATE TABLE IF NOT EXISTS fingerprint (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime INTEGER NOT NULL, fingerprint TEXT NOT NULL)")
+		except (OSError, sqlite3.Error) as e:
+			logger.warning(f'unable to open fingerprint cache {self._path}: {e}')
+			self._connection = None
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		if self._connection is not None:
+			self._connection.commit()
+			self._connection.close()
+			self._connection = None
+
+	def get(self, path: str, size: int, mtime: int) -> str | None:
+		if self._connection is None:
+			return None
+		try:
+			row = self._connection.execute("SELECT fingerprint FROM fingerprint WHERE path = ? AND size = ? AND mtime = ?", (path, size, mtime)).fetchone()
+		except UnicodeEncodeError:
+			# names that aren't valid UTF-8 are hashed every time
+			return None
+		return row[0] if row else None
+
+	def prune(self, directory: str, seen: set[str], unlisted: Set[str] = frozenset()) -> None:
+		"""
+		Forget the files below `directory` that are not in `seen` anymore. Files
+		in or below `unlisted`, paths that couldn't be read, are kept.
+		"""
+		if self._connection is None:
+			return
+		prefix = directory.rstrip('/') + '/'
+		kept = tuple(path.rstrip('/') + '/' for path in unlisted)
+		# every path starting with prefix sorts between prefix and prefix with '/' bumped to '0'
+		rows = self._connection.execute("SELECT path FROM fingerprint WHERE path >= ? AND path < ?", (prefix, prefix[:-1] + '0'))
+		gone = [(path, ) for (path, ) in rows if path not in seen and path not in unlisted and not path.startswith(kept)]
+		self._connection.executemany("DELETE FROM fingerprint WHERE path = ?", gone)
+
+	def set(self, path: str, size: int, mtime: int, fingerprint: str) -> None:
+		if self._connection is None:
+			return
+		try:
+			self._connection.execute("INSERT OR REPLACE INTO fingerprint VALUES (?, ?, ?, ?)", (path, size, mtime, fingerprint))
+		except UnicodeEncodeError:
+			return
+		self._pending += 1
+		if self._pending >= self.commit_interval:
+			self._connection.commit()
+			self._pending = 0
+
+
+class NautilusTMSUCommandDuplicates(NautilusTMSUCommand):
+	"""
+	Find files with identical contents below `paths` without tmsu. Files are
+	grouped by size first and only files sharing a size are fingerprinted,
+	reusing the cached fingerprint of unchanged files. Groups are passed to
+	`on_results` from the runner thread as each size is done, largest first.
+	"""
+	chunk_size = 1024 * 1024
+
+	def __init__(self, paths: list[str], on_results: NautilusTMSUDuplicatesCallback, cache_path: str = CACHE_PATH, batch_interval: float = 0.1) -> None:
+		super().__init__()
+		self._batch = list[NautilusTMSUDuplicateGroup]()
+		self._batch_interval = batch_interval
+		self._cache_path = cache_path
+		self._delivered = 0.0
+		self._on_results = on_results
+		self._paths = [os.path.normpath(path) for path in paths]
+		# paths `_walk` couldn't stat or list, their cached files are kept
+		self._unlisted = set[str]()
+		self.cached = 0
+		self.count = 0
+		self.hashed = 0
+
+	def execute(self) -> int | None:
+		try:
+			with NautilusTMSUFingerprintCache(self._cache_path) as cache:
+				sizes = dict[int, list[tuple[str, int]]]()
+				seen = set[str]()
+				for path, size, mtime in self._walk():
+					# overlapping selections reach some files twice
+					if path in seen:
+						continue
+					seen.add(path)
+					sizes.setdefault(size, []).append((path, mtime))
+				if not self.can_run:
+					return None
+				for directory in self._paths:
+					if os.path.isdir(directory):
+						cache.prune(directory, seen, self._unlisted)
+
+				for size in sorted(sizes, reverse=True):
+					if len(sizes[size]) < 2:
+						continue
+					fingerprints = dict[str, list[str]]()
+					for path, mtime in sizes[size]:
+						fingerprint = self._fingerprint(cache, path, size, mtime)
+						if not self.can_run:
+							return None
+						if fingerprint is not None:
+							fingerprints.setdefault(fingerprint, []).append(path)
+					for paths in fingerprints.values():
+						if len(paths) > 1:
+							self._add_result((size, sorted(paths)))
+					# hand the interpreter to the other workers between groups
+					time.sleep(0)
+		except Exception as e:
+			logger.error(f'duplicate search failed: {e}')
+			return None
+		finally:
+			self._flush()
+		return self.count
+
+	async def execute_async(self) -> int | None:
+		import asyncio
+		# file reads and sqlite block, keep them off the event loop
+		return await asyncio.to_thread(self.execute)
+
+	def _add_result(self, group: NautilusTMSUDuplicateGroup) -> None:
+		self._batch.append(group)
+		self.count += 1
+		now = time.monotonic()
+		if now - self._delivered >= self._batch_interval:
+			self._flush()
+			self._delivered = now
+
+	def _fingerprint(self, cache: NautilusTMSUFingerprintCache, path: str, size: int, mtime: int) -> str | None:
+		fingerprint = cache.get(path, size, mtime)
+		if fingerprint is not None:
+			self.cached += 1
+			return fingerprint
+
+		digest = hashlib.blake2b(digest_size=32)
+		try:
+			with open(path, 'rb') as file:
+				while self.can_run and (chunk := file.read(self.chunk_size)):
+					digest.update(chunk)
+		except OSError as e:
+			logger.debug(f'unable to read {path}: {e}')
+			return None
+		if not self.can_run:
+			return None
+		self.hashed += 1
+		fingerprint = digest.hexdigest()
+		cache.set(path, size, mtime, fingerprint)
+		return fingerprint
+
+	def _flush(self) -> None:
+		if self._batch and self.can_run:
+			self._on_results(self, self._batch)
+		self._batch = []
+
+	def _walk(self) -> Iterator[tuple[str, int, int]]:
+		"""
+		Path, size and modification time of every non empty regular file below
+		`paths`, symbolic links and databases are skipped
+		"""
+		stack = list(reversed(self._paths))
+		while stack and self.can_run:
+			path = stack.pop()
+			try:
+				info = os.stat(path, follow_symlinks=False)
+			except OSError as e:
+				logger.debug(f'unable to stat {path}: {e}')
+				self._unlisted.add(path)
+				continue
+			if stat.S_ISREG(info.st_mode):
+				if info.st_size:
+					yield path, info.st_size, info.st_mtime_ns
+				continue
+			if not stat.S_ISDIR(info.st_mode):
+				continue
+			try:
+				with os.scandir(path) as entries:
+					children = sorted(entry.path for entry in entries if entry.name != '.tmsu')
+			except OSError as e:
+				logger.debug(f'unable to list {path}: {e}')
+				self._unlisted.add(path)
+				continue
+			stack.extend(reversed(children))
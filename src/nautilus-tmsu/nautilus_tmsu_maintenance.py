@@ -0,0 +1,290 @@
+import logging
+import os
+import time
+
+from collections.abc import Callable
+from gi.repository import GObject # type: ignore
+from typing import TYPE_CHECKING, Literal
+
+from nautilus_tmsu_commands import ARGS_BUDGET, NautilusTMSUCommand, NautilusTMSUCommandCallback, NautilusTMSUCommandRepair, NautilusTMSUCommandStatus
+from nautilus_tmsu_database import NautilusTMSUDatabase
+
+if TYPE_CHECKING:
+	from nautilus_tmsu_runner import NautilusTMSURunner
+
+logger = logging.getLogger('nautilus-tmsu')
+NautilusTMSUMaintenanceJob = Literal["status", "repair"]
+NautilusTMSUMaintenanceListener = Callable[["NautilusTMSUMaintenanceState"], None]
+
+
+class NautilusTMSUCommandPlan(NautilusTMSUCommand):
+	"""
+	List directories of a maintenance pass, depth first from the end of
+	`directories`, until a batch of paths is full. Returns the batches of
+	entries to check and the directories still to list. Entries the database
+	has that are gone from disk are included; directories are listed instead
+	of being checked, so no single tmsu invocation walks a whole tree.
+	"""
+	def __init__(self, root: str, directories: list[str], budget: int = ARGS_BUDGET) -> None:
+		super().__init__()
+		self._budget = budget
+		self._database = NautilusTMSUDatabase(root)
+		self._directories = directories
+
+	def execute(self) -> tuple[list[list[str]], list[str]] | None:
+		try:
+			return self._plan()
+		except Exception as e:
+			logger.error(f'unable to plan maintenance below {self._database.root}: {e}')
+			return None
+
+	async def execute_async(self) -> tuple[list[list[str]], list[str]] | None:
+		import asyncio
+		# listing directories and sqlite reads block, keep them off the event loop
+		return await asyncio.to_thread(self.execute)
+
+	def _names(self, directory: str) -> set[str]:
+		names = set[str]()
+		try:
+			names.update(os.listdir(directory))
+		except OSError as e:
+			logger.debug(f'unable to list {directory}: {e}')
+		if self._database.available:
+			try:
+				names.update(self._database.entries(directory))
+			except Exception as e:
+				logger.debug(f'unable to read {self._database.root} directly: {e}')
+		names.discard('.tmsu')
+		return names
+
+	def _plan(self) -> tuple[list[list[str]], list[str]]:
+		stack = list(self._directories)
+		units = list[list[str]]()
+		paths = list[str]()
+		size = 0
+		while stack and not units and self.can_run:
+			directory = stack.pop()
+			children = list[str]()
+			for name in sorted(self._names(directory)):
+				path = os.path.join(directory, name)
+				if os.path.isdir(path) and not os.path.islink(path):
+					children.append(path)
+					continue
+				length = len(path.encode('UTF-8', errors='surrogateescape')) + 1
+				if paths and size + length > self._budget:
+					units.append(paths)
+					paths, size = [], 0
+				paths.append(path)
+				size += length
+			stack.extend(reversed(children))
+		if paths:
+			units.append(paths)
+		return units, stack
+
+
+class NautilusTMSUMaintenanceState(object):
+	"""
+	Progress and findings of the maintenance of one database root. A status
+	pass lists the root a directory at a time and checks the entries in batches
+	of explicit paths, so it can stop after any batch and resume with the next.
+	A repair pass is a single `tmsu repair --path=<root>`, tmsu can only scope a
+	repair to a whole tree, so it starts over when interrupted.
+	"""
+	def __init__(self, root: str) -> None:
+		self.root = root
+		self.checked: float | None = None
+		# directories still to list, None outside of a pass
+		self.directories: list[str] | None = None
+		self.done = 0
+		self.findings = {'modified': list[str](), 'missing': list[str](), 'repaired': list[str]()}
+		self.job: NautilusTMSUMaintenanceJob | None = None
+		self.repair_requested = False
+		self.running = False
+		self.units = list[list[str]]()
+
+	@property
+	def summary(self) -> str:
+		if self.directories is not None and self.job:
+			action = "Repairing" if self.job == "repair" else "Checking"
+			state = "" if self.running else ", continues when idle"
+			return f"{action}, {self.done} of {self.done + len(self.units)} batches done, {len(self.directories)} folders to go{state}"
+		if self.checked is None:
+			return "Not checked yet, runs when Nautilus is idle"
+		minutes = int((time.monotonic() - self.checked) // 60)
+		found = f"{len(self.findings['modified'])} modified, {len(self.findings['missing'])} missing"
+		if self.findings['repaired']:
+			found += f", {len(self.findings['repaired'])} repaired"
+		return f"Checked {minutes} minute{'' if minutes == 1 else 's'} ago: {found}"
+
+
+class NautilusTMSUMaintenance(object):
+	"""
+	Runs `tmsu status` (and `tmsu repair` when asked for) over every database
+	root seen by the extension while it is idle. Planning and jobs run on the
+	runner's idle worker, jobs at the lowest CPU and I/O priority, and stop as
+	soon as any other work is queued.
+	"""
+	check_interval = 60
+	idle_delay = 300
+	rescan_interval = 24 * 60 * 60
+
+	def __init__(self, runner: 'NautilusTMSURunner') -> None:
+		self._command: NautilusTMSUCommand | None = None
+		self._listeners = list[NautilusTMSUMaintenanceListener]()
+		self._roots = dict[str, NautilusTMSUMaintenanceState]()
+		self._runner = runner
+		self._timer: int | None = None
+
+	def add_listener(self, listener: NautilusTMSUMaintenanceListener) -> None:
+		self._listeners.append(listener)
+
+	def remove_listener(self, listener: NautilusTMSUMaintenanceListener) -> None:
+		if listener in self._listeners:
+			self._listeners.remove(listener)
+
+	def pause(self) -> None:
+		"""
+		Stop the running batch, it runs again once idle
+		"""
+		command = self._command
+		if command is None:
+			return
+		self._command = None
+		command.cancel()
+		for state in self._roots.values():
+			if state.running:
+				state.running = False
+				logger.debug(f'maintenance paused: {state.root}')
+				self._notify(state)
+
+	def request_repair(self, root: str) -> None:
+		state = self.watch(root)
+		state.repair_requested = True
+		self._notify(state)
+
+	def state(self, root: str) -> NautilusTMSUMaintenanceState | None:
+		return self._roots.get(root)
+
+	def watch(self, root: str) -> NautilusTMSUMaintenanceState:
+		if root not in self._roots:
+			self._roots[root] = NautilusTMSUMaintenanceState(root)
+		if self._timer is None:
+			self._timer = GObject.timeout_add(self.check_interval * 1000, self._tick)
+		return self._roots[root]
+
+	def _continue(self) -> None:
+		if self._runner.idle_time >= self.idle_delay:
+			self._run_next()
+
+	def _finish(self, state: NautilusTMSUMaintenanceState) -> None:
+		logger.info(f'maintenance {state.job} finished: {state.root}')
+		if state.job == "repair":
+			state.repair_requested = False
+		state.checked = time.monotonic()
+		state.directories = None
+		state.job = None
+		state.units = []
+		self._notify(state)
+
+	def _next_state(self) -> NautilusTMSUMaintenanceState | None:
+		now = time.monotonic()
+		# finish interrupted passes first, then requested repairs, then due checks
+		for state in self._roots.values():
+			if state.directories is not None:
+				return state
+		for state in self._roots.values():
+			if state.repair_requested:
+				return state
+		for state in self._roots.values():
+			if state.checked is None or now - state.checked >= self.rescan_interval:
+				return state
+		return None
+
+	def _notify(self, state: NautilusTMSUMaintenanceState) -> None:
+		for listener in list(self._listeners):
+			listener(state)
+
+	def _on_planned(self, command: NautilusTMSUCommandPlan, result: tuple[list[list[str]], list[str]] | None, state: NautilusTMSUMaintenanceState):
+		if command is not self._command:
+			# paused while listing, the same directories are listed again later
+			return False
+		self._command = None
+		state.running = False
+
+		if result is None:
+			# nothing more can be planned, check what was found so far
+			state.directories = []
+		else:
+			units, state.directories = result
+			state.units += units
+		if state.units or state.directories:
+			self._notify(state)
+			self._continue()
+		else:
+			self._finish(state)
+		return False
+
+	def _on_unit_complete(self, command: NautilusTMSUCommand, result: dict[str, list[str]] | list[str] | None, state: NautilusTMSUMaintenanceState):
+		if command is not self._command:
+			# paused while running, the batch is picked up again later
+			return False
+		self._command = None
+		state.running = False
+
+		paths = state.units.pop(0)
+		if result is None:
+			logger.warning(f'maintenance {state.job} failed below {state.root}, skipping {len(paths)} path(s)')
+		elif isinstance(result, dict):
+			for key, found in result.items():
+				state.findings[key] += found
+		else:
+			state.findings['repaired'] += result
+		state.done += 1
+		if state.units or state.directories:
+			self._notify(state)
+			self._continue()
+		else:
+			self._finish(state)
+		return False
+
+	def _run_next(self) -> None:
+		state = self._next_state()
+		if state is None:
+			return
+
+		if state.directories is None:
+			state.job = "repair" if state.repair_requested else "status"
+			state.done = 0
+			state.findings = {'modified': [], 'missing': [], 'repaired': []}
+			if state.job == "repair":
+				state.directories = []
+				state.units = [[state.root]]
+			else:
+				state.directories = [state.root]
+				state.units = []
+			logger.info(f'maintenance {state.job} started: {state.root}')
+
+		command: NautilusTMSUCommand
+		callback: NautilusTMSUCommandCallback
+		if state.units:
+			if state.job == "repair":
+				command = NautilusTMSUCommandRepair(state.units[0][0], state.root)
+			else:
+				command = NautilusTMSUCommandStatus(state.units[0], state.root)
+			callback = self._on_unit_complete
+		elif state.directories:
+			command = NautilusTMSUCommandPlan(state.root, state.directories)
+			callback = self._on_planned
+		else:
+			self._finish(state)
+			return
+
+		self._command = command
+		state.running = True
+		self._notify(state)
+		self._runner.add(command, callback, state, priority="idle")
+
+	def _tick(self) -> bool:
+		if self._command is None and self._runner.idle_time >= self.idle_delay:
+			self._run_next()
+		return True
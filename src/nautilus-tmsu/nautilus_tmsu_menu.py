@@ -9,10 +9,11 @@ except ValueError as e:
 	sys.exit(1)
 from typing import List, Literal
 
+from nautilus_tmsu_column import look_up_tags
 from nautilus_tmsu_commands import NautilusTMSUCommandInit
-from nautilus_tmsu_dialog import NautilusTMSUAddDialog, NautilusTMSUEditDialog, NautilusTMSUManageDialog
 from nautilus_tmsu_object import NautilusTMSUObject
-from nautilus_tmsu_runner import is_tmsu_db
+from nautilus_tmsu_policy import NautilusTMSURootPolicies
+from nautilus_tmsu_runner import find_tmsu_root, forget_tmsu_roots, is_tmsu_db
 
 MENU_ITEM_NAME = "NautilusTMSUMenu"
 
@@ -38,10 +39,13 @@ class NautilusTMSUMenu(NautilusTMSUObject, GObject.Object, Nautilus.MenuProvider
 		if len(files) == 0:
 			return []
 
-		if not is_tmsu_db(files[0]):
+		root = find_tmsu_root(files[0], log_error=False)
+		if root is None:
 			return []
 
-		menuitem = self._build_tmsu_menu("Tags", "TMSU Tags", files)
+		# the column only shows what is cached for roots it doesn't look up by itself
+		look_up = NautilusTMSURootPolicies().get(root).lazy
+		menuitem = self._build_tmsu_menu("Tags", "TMSU Tags", files, look_up)
 
 		return [
 			menuitem,
@@ -74,6 +78,8 @@ class NautilusTMSUMenu(NautilusTMSUObject, GObject.Object, Nautilus.MenuProvider
 			return
 
 		NautilusTMSUCommandInit(directory).execute()
+		forget_tmsu_roots()
+		self._current_background_folder = None
 
 	def on_menu_init_activated(self, menu_item: Nautilus.MenuItem, directory: Nautilus.FileInfo):
 		application = Gtk.Application.get_default()
@@ -85,13 +91,22 @@ class NautilusTMSUMenu(NautilusTMSUObject, GObject.Object, Nautilus.MenuProvider
 		dialog.set_buttons(["Cancel", "OK"])
 		dialog.choose(window, None, self.on_alert_dialog_chosen, directory)
 
-	def on_menu_item_activated(self, menu_item: Nautilus.MenuItem, action: Literal["add", "edit", "manage"], files: List[Nautilus.FileInfo]):
+	def on_menu_item_activated(self, menu_item: Nautilus.MenuItem, action: Literal["add", "duplicates", "edit", "find", "lookup", "manage"], files: List[Nautilus.FileInfo]):
+		if action == "lookup":
+			look_up_tags(files)
+			return
+
+		# deferred so Adw and the dialogs are only loaded once a dialog is opened
+		from nautilus_tmsu_dialog import NautilusTMSUAddDialog, NautilusTMSUDuplicatesDialog, NautilusTMSUEditDialog, NautilusTMSUManageDialog, NautilusTMSUQueryDialog
+
 		if action == "add":
 			dialog = NautilusTMSUAddDialog(files)
+		elif action == "duplicates":
+			dialog = NautilusTMSUDuplicatesDialog(files)
 		elif action == "edit":
-			if len(files) != 1:
-				raise TypeError(f"Edit can only work with 1 file, got {len(files)} files")
-			dialog = NautilusTMSUEditDialog(files[0])
+			dialog = NautilusTMSUEditDialog(files)
+		elif action == "find":
+			dialog = NautilusTMSUQueryDialog(files[0])
 		elif action == "manage":
 			dialog = NautilusTMSUManageDialog(files[0])
 		else:
@@ -99,7 +114,7 @@ class NautilusTMSUMenu(NautilusTMSUObject, GObject.Object, Nautilus.MenuProvider
 
 		dialog.present()
 
-	def _build_menu_item(self, name: str, label: str, action: Literal["add", "edit", "manage"] | None = None, files: List[Nautilus.FileInfo] = []) -> Nautilus.MenuItem:
+	def _build_menu_item(self, name: str, label: str, action: Literal["add", "duplicates", "edit", "find", "lookup", "manage"] | None = None, files: List[Nautilus.FileInfo] = []) -> Nautilus.MenuItem:
 		menuitem = Nautilus.MenuItem(name=name, label=label)
 		if action and len(files):
 			menuitem.connect("activate", self.on_menu_item_activated, action, files)
@@ -113,7 +128,7 @@ class NautilusTMSUMenu(NautilusTMSUObject, GObject.Object, Nautilus.MenuProvider
 		menuitem.connect("activate", self.on_menu_init_activated, directory)
 		return menuitem
 
-	def _build_tmsu_menu(self, name: str, label: str, files: List[Nautilus.FileInfo] = []) -> Nautilus.MenuItem:
+	def _build_tmsu_menu(self, name: str, label: str, files: List[Nautilus.FileInfo] = [], look_up: bool = False) -> Nautilus.MenuItem:
 		menuitem = self._build_menu_item(name, label)
 		submenu = Nautilus.Menu()
 		menuitem.set_submenu(submenu)
@@ -121,10 +136,21 @@ class NautilusTMSUMenu(NautilusTMSUObject, GObject.Object, Nautilus.MenuProvider
 		add_tags_menuitem = self._build_menu_item(f"{name}::Add", "Add Tags", "add", files)
 		submenu.append_item(add_tags_menuitem)
 
+		edit_tags_menuitem = self._build_menu_item(f"{name}::Edit", "Edit Tags", "edit", files)
+		submenu.append_item(edit_tags_menuitem)
+
 		if len(files) == 1:
-			edit_tags_menuitem = self._build_menu_item(f"{name}::Edit", "Edit Tags", "edit", files)
-			submenu.append_item(edit_tags_menuitem)
 			manage_tags_menuitem = self._build_menu_item(f"{name}::Manage", "Manage Tags", "manage", files=files)
 			submenu.append_item(manage_tags_menuitem)
 
+		find_menuitem = self._build_menu_item(f"{name}::Find", "Find by Tags", "find", files[:1])
+		submenu.append_item(find_menuitem)
+
+		duplicates_menuitem = self._build_menu_item(f"{name}::Duplicates", "Find Duplicates", "duplicates", files)
+		submenu.append_item(duplicates_menuitem)
+
+		if look_up:
+			look_up_menuitem = self._build_menu_item(f"{name}::LookUp", "Look Up Tags", "lookup", files)
+			submenu.append_item(look_up_menuitem)
+
 		return menuitem
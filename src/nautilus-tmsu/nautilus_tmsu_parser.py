@@ -0,0 +1,139 @@
+import re
+
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+# characters escaped with a backslash in tag and value names, colons too so a
+# tag can't be taken for a file name
+_ESCAPES = str.maketrans({"\\": "\\\\", " ": "\\ ", ":": "\\:", "=": "\\="})
+# the name part of `name=value`, up to the first unescaped equals sign
+_NAME = re.compile(r"(?:\\.|[^\\=])*", re.S)
+
+
+def escape(name: str) -> str:
+	return name.translate(_ESCAPES)
+
+
+def unescape(text: str) -> str:
+	if "\\" not in text:
+		return text
+	if "\\\\" not in text:
+		return text.replace("\\", "")
+	# escaped backslashes first, every other backslash only escapes what follows
+	return "\\".join(part.replace("\\", "") for part in text.split("\\\\"))
+
+
+def split_tag(text: str) -> tuple[str, str | None]:
+	"""
+	Unescaped tag and value of a `tag` or `tag=value` as printed by tmsu
+	"""
+	if "\\" not in text:
+		tag, separator, value = text.partition("=")
+		return tag, value if separator else None
+
+	end = _NAME.match(text).end() # type: ignore
+	if end < len(text) and text[end] == "=":
+		return unescape(text[:end]), unescape(text[end + 1:])
+	return unescape(text), None
+
+
+def format_tag(tag: str, value: str | None = None) -> str:
+	"""
+	`tag` or `tag=value` escaped the way tmsu prints and reads them
+	"""
+	return escape(tag) if value is None else f"{escape(tag)}={escape(value)}"
+
+
+class NautilusTMSUTagRecord(NamedTuple):
+	"""
+	Tags of one file as tmsu printed them, escaped, the form commands take
+	them back in. `path` is None when tmsu printed no file name. A file whose
+	tags are split over several chunks of output comes in several records.
+	"""
+	path: str | None
+	tags: list[str]
+
+	def fields(self) -> list[tuple[str, str | None]]:
+		"""
+		Unescaped tag and value of every tag
+		"""
+		return [split_tag(text) for text in self.tags]
+
+
+class NautilusTMSUTagParser(object):
+	"""
+	Incremental parser of `tmsu tags -1` output. Bytes are fed as they come
+	from the pipe and a record is returned for every file with complete lines
+	in the chunk, only the unfinished last line is kept. Sections start with
+	the file name followed by an unescaped colon; output without one belongs
+	to `path`. Tags are kept as printed, they are only split into tag and
+	value when asked for.
+	"""
+	def __init__(self, path: str | None = None) -> None:
+		self._path = path
+		self._pending = b""
+
+	def close(self) -> list[NautilusTMSUTagRecord]:
+		"""
+		Records of a last line missing its newline
+		"""
+		pending, self._pending = self._pending, b""
+		if not pending:
+			return []
+		return self._records(str(pending, "UTF-8", "surrogateescape"))
+
+	def feed(self, data: bytes) -> list[NautilusTMSUTagRecord]:
+		records = list[NautilusTMSUTagRecord]()
+		start = 0
+		if self._pending:
+			# only the unfinished line is joined with the chunk, not the whole chunk
+			start = data.find(b"\n") + 1
+			if not start:
+				self._pending += data
+				return records
+			records = self._records(str(self._pending + data[:start], "UTF-8", "surrogateescape"))
+		end = data.rfind(b"\n", start) + 1
+		self._pending = data[max(start, end):]
+		if end:
+			records += self._records(str(memoryview(data)[start:end], "UTF-8", "surrogateescape"))
+		return records
+
+	def _records(self, text: str) -> list[NautilusTMSUTagRecord]:
+		if "\r" in text:
+			text = text.replace("\r\n", "\n")
+		records = list[NautilusTMSUTagRecord]()
+		# the generated __new__ of a named tuple costs more than parsing a file
+		record = tuple.__new__
+		path = self._path
+		tags = list[str]()
+		for line in text.split("\n"):
+			if not line:
+				continue
+			if line[-1] == ":":
+				name = line[:-1]
+				# an even number of backslashes before the colon escape each other
+				if (len(name) - len(name.rstrip("\\"))) % 2 == 0:
+					if tags:
+						records.append(record(NautilusTMSUTagRecord, (path, tags)))
+						tags = []
+					path = unescape(name)
+					continue
+			tags.append(line)
+		if tags:
+			records.append(record(NautilusTMSUTagRecord, (path, tags)))
+		self._path = path
+		return records
+
+
+def parse_tags(output: str | bytes | Iterable[bytes], path: str | None = None) -> Iterator[NautilusTMSUTagRecord]:
+	"""
+	Records of complete `tmsu tags -1` output, or of an iterable of chunks
+	"""
+	parser = NautilusTMSUTagParser(path)
+	if isinstance(output, str):
+		output = output.encode("UTF-8", "surrogateescape")
+	if isinstance(output, bytes):
+		output = (output, )
+	for chunk in output:
+		yield from parser.feed(chunk)
+	yield from parser.close()
@@ -0,0 +1,187 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from typing import Literal
+
+from nautilus_tmsu_config import get_option
+
+logger = logging.getLogger('nautilus-tmsu')
+
+NautilusTMSUStrategy = Literal["local", "batched", "lazy"]
+STRATEGIES: tuple[NautilusTMSUStrategy, ...] = ("local", "batched", "lazy")
+
+# cache TTL and commands running at once against one root, 0 means unlimited
+STRATEGY_DEFAULTS: dict[NautilusTMSUStrategy, dict[str, float]] = {
+	"local": {"ttl": 30.0, "concurrency": 0},
+	"batched": {"ttl": 300.0, "concurrency": 2},
+	"lazy": {"ttl": 3600.0, "concurrency": 1},
+}
+
+# network and FUSE filesystems where every stat is a round trip
+REMOTE_FILESYSTEMS = frozenset({
+	"9p", "afs", "ceph", "cifs", "davfs", "fuse.gvfsd-fuse", "fuse.rclone", "fuse.s3fs",
+	"fuse.sshfs", "glusterfs", "ncpfs", "nfs", "nfs4", "smb3", "smbfs",
+})
+
+
+def filesystem_type(path: str, mountinfo: str = "/proc/self/mountinfo") -> str | None:
+	"""
+	Type of the filesystem `path` lives on, from the longest matching mount
+	point, None when it can't be told
+	"""
+	path = os.path.realpath(path)
+	found: tuple[int, str] | None = None
+	try:
+		with open(mountinfo, encoding="UTF-8", errors="surrogateescape") as lines:
+			for line in lines:
+				head, _, rest = line.partition(" - ")
+				fields = head.split()
+				if len(fields) < 5 or not rest:
+					continue
+				# mount points escape blanks and backslashes as octal
+				mount_point = re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), fields[4])
+				if path != mount_point and not path.startswith(mount_point.rstrip("/") + "/"):
+					continue
+				if found is None or len(mount_point) >= found[0]:
+					found = (len(mount_point), rest.split()[0])
+	except OSError as e:
+		logger.debug(f"unable to read {mountinfo}: {e}")
+		return None
+	return found[1] if found else None
+
+
+class NautilusTMSURootPolicy(object):
+	"""
+	How the extension treats one database root. The strategy follows from the
+	filesystem type and the measured latency of tmsu commands:
+
+	local: a `tmsu tags` per file, short cache TTL
+	batched: tags of many files per invocation, the rest of a directory
+		prefetched with the first file, longer TTL, fewer commands at once
+	lazy: nothing is looked up automatically, only cached values are shown
+		until tags are looked up from the menu; one file is still looked up
+		every `probe_interval` seconds to notice the root got faster
+
+	Every value can be pinned in a `[root:<path>]` section of the configuration.
+	"""
+	# average seconds per file above which a root gets a slower strategy
+	batched_latency = 0.25
+	lazy_latency = 2.0
+	probe_interval = 300.0
+	# weight of the newest sample in the moving average
+	smoothing = 0.2
+
+	def __init__(self, root: str, filesystem: str | None = None) -> None:
+		self.root = root
+		self.filesystem = filesystem
+		self.latency: float | None = None
+		# when a lookup was last timed, or a lazy root last probed
+		self._measured: float | None = None
+		# batches are cheap per file, once a root needed them it keeps them
+		self._slow = False
+		self._section = f"root:{root.rstrip('/') or '/'}"
+
+	@property
+	def batch(self) -> bool:
+		return self.strategy != "local"
+
+	@property
+	def concurrency(self) -> int:
+		return int(self._option("concurrency"))
+
+	@property
+	def lazy(self) -> bool:
+		return self.strategy == "lazy"
+
+	@property
+	def strategy(self) -> NautilusTMSUStrategy:
+		configured = get_option(self._section, "strategy")
+		if configured in STRATEGIES:
+			return configured # type: ignore
+		if configured:
+			logger.error(f"unknown strategy {configured} for {self.root}, choosing one")
+
+		if self.latency is not None and self.latency >= self.lazy_latency:
+			return "lazy"
+		if self._slow or self.filesystem in REMOTE_FILESYSTEMS:
+			return "batched"
+		return "local"
+
+	@property
+	def ttl(self) -> float:
+		return self._option("ttl")
+
+	def probe(self) -> bool:
+		"""
+		Whether a root that turned lazy by its latency should look tags up once
+		more; True at most every `probe_interval` seconds without lookups
+		"""
+		if self.strategy != "lazy" or get_option(self._section, "strategy"):
+			return False
+		now = time.monotonic()
+		if self._measured is not None and now - self._measured < self.probe_interval:
+			return False
+		self._measured = now
+		return True
+
+	def record(self, seconds: float | None, files: int = 1) -> None:
+		"""
+		Add the duration of a tag lookup of `files` files against this root to
+		the average
+		"""
+		if seconds is None or files < 1:
+			return
+		before = self.strategy
+		self._measured = time.monotonic()
+		seconds /= files
+		if self.latency is None:
+			self.latency = seconds
+		else:
+			self.latency += self.smoothing * (seconds - self.latency)
+		if self.latency >= self.batched_latency:
+			self._slow = True
+		if self.strategy != before:
+			logger.info(f"{self.root}: {self.strategy} strategy, {self.latency:.3f}s per file")
+
+	def _option(self, option: str) -> float:
+		default = STRATEGY_DEFAULTS[self.strategy][option]
+		value = get_option(self._section, option)
+		if value is None:
+			return default
+		try:
+			return float(value)
+		except ValueError:
+			logger.error(f"invalid {option} {value!r} for {self.root}")
+			return default
+
+
+class NautilusTMSURootPolicies(object):
+	"""
+	Policy of every database root seen by the extension
+	"""
+	_instance: 'NautilusTMSURootPolicies'
+	_lock = threading.Lock()
+
+	def __new__(cls, *args, **kwargs) -> 'NautilusTMSURootPolicies':
+		if not hasattr(cls, '_instance') or not cls._instance:
+			with cls._lock:
+				if not hasattr(cls, '_instance') or not cls._instance:
+					cls._instance = super().__new__(cls, *args, **kwargs)
+		return cls._instance
+
+	def __init__(self) -> None:
+		if hasattr(self, '_policies'):
+			return
+
+		self._policies = dict[str, NautilusTMSURootPolicy]()
+
+	def get(self, root: str) -> NautilusTMSURootPolicy:
+		with self._lock:
+			policy = self._policies.get(root)
+			if policy is None:
+				policy = self._policies[root] = NautilusTMSURootPolicy(root, filesystem_type(root))
+				logger.info(f"{root}: {policy.filesystem} filesystem, {policy.strategy} strategy")
+			return policy
@@ -6,6 +6,7 @@ from typing import Any, List
 from nautilus_tmsu_commands import NautilusTMSUCommandTags
 from nautilus_tmsu_runner import is_tmsu_db
 from nautilus_tmsu_object import NautilusTMSUObject
+from nautilus_tmsu_utils import format_tags
 
 
 class NautilusTMSUProperties(NautilusTMSUObject, GObject.Object, Nautilus.PropertiesModelProvider):
@@ -26,7 +27,7 @@ class NautilusTMSUProperties(NautilusTMSUObject, GObject.Object, Nautilus.Proper
 			tags_model.append(
 				Nautilus.PropertiesItem(
 					name="Tag",
-					value=tag.replace('\\ ', ' ')
+					value=format_tags([tag])
 				)
 			)
 
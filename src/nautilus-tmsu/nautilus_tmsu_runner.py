@@ -1,16 +1,32 @@
+from __future__ import annotations
+
 import logging
 import re
 import queue
 import threading
+import time
 
-from gi.repository import GObject, Nautilus # type: ignore
-from typing import TypedDict
+from collections.abc import Callable
+from gi.repository import GObject # type: ignore
+from typing import TYPE_CHECKING, Literal, TypedDict
 
 from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandCallback
-from nautilus_tmsu_utils import get_path_from_file_info
+from nautilus_tmsu_config import get_option
+from nautilus_tmsu_policy import NautilusTMSURootPolicies
+from nautilus_tmsu_utils import find_database_root, get_path_from_file_info
+
+if TYPE_CHECKING:
+	from gi.repository import Nautilus # type: ignore
+	from nautilus_tmsu_maintenance import NautilusTMSUMaintenance
 
 logger = logging.getLogger('nautilus-tmsu')
 
+# seconds a directory outside of any database is remembered as such
+ROOT_TTL = 60.0
+# directory -> (expiry, root or None)
+_roots = dict[str, tuple[float, str | None]]()
+_roots_lock = threading.Lock()
+
 class classproperty:
 	def __init__(self, method) -> None:
 		self.method = method
@@ -19,75 +35,237 @@ class classproperty:
 		return self.method(owner)
 
 
+# interactive work (column, dialogs) never waits behind background work or
+# idle maintenance, each class has its own worker. The duplicate search reads
+# whole files for hours and gets a worker of its own as well, so other
+# background work doesn't queue behind it.
+NautilusTMSURunnerPriority = Literal["interactive", "background", "duplicates", "idle"]
+PRIORITIES: tuple[NautilusTMSURunnerPriority, ...] = ("interactive", "background", "duplicates", "idle")
+
+
 class NautilusTMSURunnerQueue(TypedDict):
 	command: NautilusTMSUCommand
 	callback: NautilusTMSUCommandCallback | None
 	callback_args: tuple | None
 
 
+def runner_backend(backend: str | None = None) -> type['NautilusTMSURunner']:
+	"""
+	Runner class of `backend`, by default selected by the `backend` option of
+	the `[runner]` section: `thread` (default) or `asyncio`
+	"""
+	if backend is None:
+		backend = get_option('runner', 'backend', 'thread')
+	if backend == 'asyncio':
+		from nautilus_tmsu_runner_async import NautilusTMSUAsyncRunner
+		return NautilusTMSUAsyncRunner
+	if backend != 'thread':
+		logger.error(f'unknown runner backend {backend}, using thread')
+	return NautilusTMSURunner
+
+
 class NautilusTMSURunner(GObject.Object):
 	_instance: 'NautilusTMSURunner'
 	_lock = threading.Lock()
 
-	def __new__(cls, *args, **kwargs) -> 'NautilusTMSURunner':
-		if not hasattr(cls, '_instance') or not cls._instance:
-			with cls._lock:
-				if not hasattr(cls, '_instance') or not cls._instance:
+	def __new__(cls, *args, backend: str | None = None, **kwargs) -> 'NautilusTMSURunner':
+		# NautilusTMSURunner() hands out the configured backend, or `backend`
+		# when given, each backend class keeps its own instance
+		if cls is NautilusTMSURunner:
+			cls = runner_backend(backend)
+		if not cls.__dict__.get('_instance'):
+			with NautilusTMSURunner._lock:
+				if not cls.__dict__.get('_instance'):
 					cls._instance = super().__new__(cls, *args, **kwargs)
 		return cls._instance
 
-	def __init__(self) -> None:
+	def __init__(self, backend: str | None = None) -> None:
+		# `backend` is only looked at by __new__
 		if hasattr(self, '_running') and self._running:
 			return
 
 		super()
-		self._queue = queue.Queue[NautilusTMSURunnerQueue]()
-		self._start_worker_thread()
-		GObject.timeout_add(5, self._keep_alive)
+		self._queues = {priority: queue.Queue[NautilusTMSURunnerQueue]() for priority in PRIORITIES}
+		self._workers = dict[NautilusTMSURunnerPriority, threading.Thread]()
+		self._worker_lock = threading.Lock()
+		self._dispatcher: Callable[..., object] | None = None
+		self._last_activity = time.monotonic()
+		self._maintenance: 'NautilusTMSUMaintenance | None' = None
 		self._running: bool = True
 
 	@classproperty
 	def lock(cls):
 		return cls._lock
 
-	def add(self, command: NautilusTMSUCommand, callback: NautilusTMSUCommandCallback | None = None, *callback_args) -> None:
-		self._queue.put({
+	@property
+	def dispatcher(self) -> Callable[..., object] | None:
+		"""
+		Callable delivering `callback(*args)` to the thread that owns the
+		callbacks, GObject.idle_add when unset. Tools running without a main
+		loop replace it.
+		"""
+		return self._dispatcher
+
+	@dispatcher.setter
+	def dispatcher(self, value: Callable[..., object] | None):
+		self._dispatcher = value
+
+	@property
+	def idle_time(self) -> float:
+		"""
+		Seconds since work other than maintenance was last queued
+		"""
+		return time.monotonic() - self._last_activity
+
+	@property
+	def maintenance(self) -> 'NautilusTMSUMaintenance':
+		if self._maintenance is None:
+			with NautilusTMSURunner._lock:
+				if self._maintenance is None:
+					from nautilus_tmsu_maintenance import NautilusTMSUMaintenance
+					self._maintenance = NautilusTMSUMaintenance(self)
+		return self._maintenance
+
+	@property
+	def started(self) -> bool:
+		return bool(self._workers)
+
+	def add(self, command: NautilusTMSUCommand, callback: NautilusTMSUCommandCallback | None = None, *callback_args, priority: NautilusTMSURunnerPriority = "interactive") -> None:
+		if priority != "idle":
+			self._last_activity = time.monotonic()
+			if self._maintenance:
+				self._maintenance.pause()
+		self._submit(priority, {
 			'command': command,
 			'callback': callback,
 			'callback_args': callback_args,
 		})
 
+	def _dispatch(self, callback: NautilusTMSUCommandCallback, *args) -> None:
+		"""
+		Hand a result to its callback on the main loop
+		"""
+		(self._dispatcher or GObject.idle_add)(callback, *args)
+
 	def _keep_alive(self):
 		"""
 		Keep alive to get attention from Nautilus
 		"""
 		return True
 
-	def _process_queue(self):
+	def _process_queue(self, priority: NautilusTMSURunnerPriority):
+		tasks = self._queues[priority]
 		while True:
-			task = self._queue.get()
+			task = tasks.get()
 			# it's possible the command has been canceled
 			if task['command'].can_run:
+				started = time.monotonic()
 				result = task['command'].execute()
+				task['command'].elapsed = time.monotonic() - started
 				if task['callback']:
-					GObject.idle_add(task['callback'], task['command'], result, *task['callback_args'] or tuple())
-			self._queue.task_done()
+					self._dispatch(task['callback'], task['command'], result, *task['callback_args'] or tuple())
+			tasks.task_done()
+
+	def _start_worker_thread(self, priority: NautilusTMSURunnerPriority):
+		"""
+		Start the worker thread of `priority` and the keep alive timer, deferred
+		until the first command is queued so an idle extension costs nothing at
+		startup
+		"""
+		with self._worker_lock:
+			if priority in self._workers:
+				return
+			if not self._workers:
+				GObject.timeout_add(5, self._keep_alive)
+			thread = threading.Thread(target=self._process_queue, args=(priority, ), daemon=True)
+			thread.start()
+			self._workers[priority] = thread
+		logger.info(f'{priority} worker thread started')
+
+	def _submit(self, priority: NautilusTMSURunnerPriority, task: NautilusTMSURunnerQueue) -> None:
+		if priority not in self._workers:
+			self._start_worker_thread(priority)
+		self._queues[priority].put(task)
 
-	def _start_worker_thread(self):
-		thread = threading.Thread(target=self._process_queue, daemon=True)
-		thread.start()
-		logger.info('worker thread started')
 
+def find_tmsu_root(file_info: Nautilus.FileInfo, log_error: bool = True, run_tmsu: bool = True):
+	"""
+	Root of the database of `file_info`, looked up once per directory and
+	remembered for the cache TTL of its root (a short while when there is none).
+	Without `run_tmsu` the root is the nearest `.tmsu/db` above the directory
+	instead of what `tmsu info` says, cheap enough for the main loop.
+	"""
+	directory = get_path_from_file_info(file_info, True)
+	with _roots_lock:
+		cached = _roots.get(directory)
+	if cached is not None and time.monotonic() < cached[0]:
+		return cached[1]
 
-def find_tmsu_root(file_info: Nautilus.FileInfo):
-	result = NautilusTMSUCommand('info', cwd=get_path_from_file_info(file_info, True)).execute()
-	if result:
-		m = re.findall(r'Root path: ([^\n]+)', result)
+	root = None
+	if run_tmsu:
+		result = NautilusTMSUCommand('info', cwd=directory, log_error=log_error).execute()
+		m = re.findall(r'Root path: ([^\n]+)', result) if result else None
 		if m:
-			return m[0]
-	return None
+			root = m[0]
+	else:
+		root = find_database_root(directory)
+	expires = time.monotonic() + ROOT_TTL
+	if root is not None:
+		expires = time.monotonic() + NautilusTMSURootPolicies().get(root).ttl
+		# every database the extension comes across gets maintained, roots
+		# are looked up on workers while maintenance lives on the main loop
+		GObject.idle_add(_watch_root, root)
+	with _roots_lock:
+		_roots[directory] = (expires, root)
+	return root
+
+
+def forget_tmsu_roots() -> None:
+	"""
+	Drop every remembered root, e.g. after a database was created
+	"""
+	with _roots_lock:
+		_roots.clear()
 
 
 def is_tmsu_db(file_info: Nautilus.FileInfo):
-	cwd = get_path_from_file_info(file_info, True)
-	return False if (NautilusTMSUCommand("info", cwd=cwd, log_error=False)).execute() is None else True
+	return find_tmsu_root(file_info, log_error=False) is not None
+
+
+def group_by_tmsu_root(files: list[Nautilus.FileInfo]) -> dict[str, list[Nautilus.FileInfo]]:
+	"""
+	Group files by the root of their database, looking the root up once per
+	directory. Files outside of a database are left out.
+	"""
+	roots = dict[str, str | None]()
+	groups: dict[str, list[Nautilus.FileInfo]] = {}
+	for file in files:
+		cwd = get_path_from_file_info(file, True)
+		if cwd not in roots:
+			roots[cwd] = find_tmsu_root(file)
+		root = roots[cwd]
+		if root is not None:
+			groups.setdefault(root, []).append(file)
+	return groups
+
+
+class NautilusTMSUCommandRoots(NautilusTMSUCommand):
+	"""
+	`group_by_tmsu_root` run by the runner, so the `tmsu info` per directory
+	never blocks the main loop
+	"""
+	def __init__(self, files: list[Nautilus.FileInfo]) -> None:
+		super().__init__()
+		self._files = files
+
+	def execute(self) -> dict[str, list[Nautilus.FileInfo]]:
+		return group_by_tmsu_root(self._files)
+
+	async def execute_async(self) -> dict[str, list[Nautilus.FileInfo]]:
+		import asyncio
+		return await asyncio.to_thread(self.execute)
+
+
+def _watch_root(root: str) -> Literal[False]:
+	NautilusTMSURunner().maintenance.watch(root)
+	return False
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import threading
+import time
+
+from gi.repository import GObject # type: ignore
+
+from nautilus_tmsu_config import get_option
+from nautilus_tmsu_runner import NautilusTMSURunner, NautilusTMSURunnerPriority, NautilusTMSURunnerQueue
+
+logger = logging.getLogger('nautilus-tmsu')
+
+CONCURRENCY = 4
+
+
+def runner_concurrency() -> int:
+	"""
+	Interactive commands running at once, the `concurrency` option of the
+	`[runner]` section
+	"""
+	value = get_option('runner', 'concurrency')
+	if not value:
+		return CONCURRENCY
+	try:
+		concurrency = int(value)
+	except ValueError:
+		concurrency = 0
+	if concurrency < 1:
+		logger.warning(f'invalid runner concurrency {value!r}, using {CONCURRENCY}')
+		return CONCURRENCY
+	return concurrency
+
+
+class NautilusTMSUAsyncRunner(NautilusTMSURunner):
+	"""
+	Runner backend driving every command from a private asyncio loop on a
+	single thread. Up to `concurrency` interactive commands, one background,
+	one duplicate search and one idle command run at the same time, callbacks
+	are delivered on the main loop exactly like the thread backend.
+	"""
+	def __init__(self, backend: str | None = None) -> None:
+		if hasattr(self, '_running') and self._running:
+			return
+
+		super().__init__()
+		self._loop: asyncio.AbstractEventLoop | None = None
+		self._semaphores = dict[NautilusTMSURunnerPriority, asyncio.Semaphore]()
+		# read when the loop starts, tools may change it before queuing work
+		self.concurrency = runner_concurrency()
+
+	@property
+	def started(self) -> bool:
+		return self._loop is not None
+
+	async def _run_task(self, priority: NautilusTMSURunnerPriority, task: NautilusTMSURunnerQueue) -> None:
+		async with self._semaphores[priority]:
+			command = task['command']
+			# it's possible the command has been canceled while waiting
+			if not command.can_run:
+				return
+			started = time.monotonic()
+			try:
+				result = await command.execute_async()
+			except asyncio.CancelledError:
+				logger.debug('command cancelled')
+				result = None
+			except Exception as e:
+				if command.can_run:
+					logger.error(f'command failed: {e}')
+				result = None
+			command.elapsed = time.monotonic() - started
+			if task['callback']:
+				self._dispatch(task['callback'], command, result, *task['callback_args'] or tuple())
+
+	def _start_loop(self) -> None:
+		"""
+		Start the event loop thread and keep alive timer on the first command
+		"""
+		with self._worker_lock:
+			if self._loop is not None:
+				return
+			loop = asyncio.new_event_loop()
+			self._semaphores = {
+				"interactive": asyncio.Semaphore(self.concurrency),
+				"background": asyncio.Semaphore(1),
+				"duplicates": asyncio.Semaphore(1),
+				"idle": asyncio.Semaphore(1),
+			}
+			thread = threading.Thread(target=loop.run_forever, daemon=True)
+			thread.start()
+			GObject.timeout_add(5, self._keep_alive)
+			self._loop = loop
+		logger.info(f'asyncio runner started, concurrency {self.concurrency}')
+
+	def _submit(self, priority: NautilusTMSURunnerPriority, task: NautilusTMSURunnerQueue) -> None:
+		if self._loop is None:
+			self._start_loop()
+		assert self._loop is not None
+		asyncio.run_coroutine_threadsafe(self._run_task(priority, task), self._loop)
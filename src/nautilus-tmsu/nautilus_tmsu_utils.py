@@ -1,15 +1,61 @@
+from __future__ import annotations
+
+import functools
 import os
+import shutil
 
-from gi.repository import Nautilus # type: ignore
+from typing import TYPE_CHECKING
 from urllib.parse import unquote
 
+from nautilus_tmsu_parser import split_tag
+
+# only the annotations need Nautilus, which pulls in GTK, keep this module
+# usable from the headless tools
+if TYPE_CHECKING:
+	from gi.repository import Nautilus # type: ignore
+
+
+def find_database_root(directory: str) -> str | None:
+	"""
+	Nearest directory at or above `directory` holding a `.tmsu/db`, the same
+	walk tmsu does to find its database
+	"""
+	directory = os.path.abspath(directory)
+	while True:
+		if os.path.isfile(os.path.join(directory, '.tmsu', 'db')):
+			return directory
+		parent = os.path.dirname(directory)
+		if parent == directory:
+			return None
+		directory = parent
+
 
-def get_path_from_file_info(file_info: Nautilus.FileInfo, force_dir: bool = False):
+def get_path_from_file_info(file_info: Nautilus.FileInfo | str, force_dir: bool = False):
+	if isinstance(file_info, str):
+		if force_dir and not os.path.isdir(file_info):
+			return os.path.dirname(file_info)
+		return file_info
 	if force_dir and not file_info.is_directory():
 		return unquote(file_info.get_parent_uri())[7:]
 	return unquote(file_info.get_uri())[7:]
 
 
+@functools.cache
+def low_priority_prefix() -> tuple[str, ...]:
+	"""
+	Command prefix running a child with the lowest CPU and idle I/O priority,
+	using whichever of nice and ionice are installed
+	"""
+	prefix = tuple[str, ...]()
+	nice = shutil.which('nice')
+	if nice:
+		prefix += (nice, '-n', '19')
+	ionice = shutil.which('ionice')
+	if ionice:
+		prefix += (ionice, '-c', '3')
+	return prefix
+
+
 def which_tmsu(tmsu="tmsu"):
 	def is_exe(fpath):
 		return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
@@ -23,4 +69,15 @@ def which_tmsu(tmsu="tmsu"):
 			if is_exe(exe_file):
 				return exe_file
 
-	raise ValueError("Command `tmsu` is not available on $PATH")
\ No newline at end of file
+	raise ValueError("Command `tmsu` is not available on $PATH")
+
+
+def format_tags(tags: list[str]):
+	"""
+	Tags as shown to the user, unescaped, from the form tmsu prints
+	"""
+	formatted = []
+	for text in tags:
+		tag, value = split_tag(text)
+		formatted.append(tag if value is None else f"{tag}={value}")
+	return ', '.join(formatted)
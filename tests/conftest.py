@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import stat
+
+import pytest
+
+from urllib.parse import quote
+
+from nautilus_tmsu_database import NautilusTMSUDatabase
+
+
+class FakeFileInfo(object):
+	"""
+	Stand in for Nautilus.FileInfo backed by a local path
+	"""
+	def __init__(self, path: str, is_directory: bool = False) -> None:
+		self.path = path
+		self.attributes = dict[str, str]()
+		self.emblems = list[str]()
+		self.invalidated = 0
+		self._is_directory = is_directory
+
+	def add_emblem(self, emblem: str) -> None:
+		self.emblems.append(emblem)
+
+	def add_string_attribute(self, name: str, value: str) -> None:
+		self.attributes[name] = value
+
+	def get_parent_uri(self) -> str:
+		return f"file://{quote(os.path.dirname(self.path))}"
+
+	def get_uri(self) -> str:
+		return f"file://{quote(self.path)}"
+
+	def get_uri_scheme(self) -> str:
+		return "file"
+
+	def invalidate_extension_info(self) -> None:
+		self.invalidated += 1
+
+	def is_directory(self) -> bool:
+		return self._is_directory
+
+
+class FakeRunner(object):
+	"""
+	Stand in for NautilusTMSURunner keeping queued commands until a test
+	completes them
+	"""
+	def __init__(self) -> None:
+		self.idle_time = 0.0
+		self.priorities = list[str]()
+		self.tasks = list()
+
+	def add(self, command, callback=None, *callback_args, priority="interactive"):
+		self.priorities.append(priority)
+		self.tasks.append((command, callback, callback_args))
+
+	def complete(self, result=""):
+		"""
+		Hand `result` to the callback of the oldest command
+		"""
+		command, callback, callback_args = self.tasks.pop(0)
+		callback(command, result, *callback_args)
+
+	def execute(self):
+		"""
+		Run the oldest command and hand its result to its callback
+		"""
+		self.complete(self.tasks[0][0].execute())
+
+
+@pytest.fixture
+def fake_runner():
+	return FakeRunner()
+
+
+@pytest.fixture
+def file_info():
+	return FakeFileInfo
+
+
+@pytest.fixture
+def database(tmp_path):
+	"""
+	Minimal TMSU database in tmp_path with a few tagged files
+	"""
+	os.mkdir(tmp_path / ".tmsu")
+	connection = sqlite3.connect(tmp_path / ".tmsu" / "db")
+	connection.executescript("""
+		CREATE TABLE tag (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+		CREATE TABLE file (id INTEGER PRIMARY KEY, directory TEXT NOT NULL, name TEXT NOT NULL, fingerprint TEXT NOT NULL, mod_time DATETIME NOT NULL, size INTEGER NOT NULL, is_dir BOOLEAN NOT NULL);
+		CREATE TABLE file_tag (file_id INTEGER NOT NULL, tag_id INTEGER NOT NULL, value_id INTEGER NOT NULL);
+		CREATE TABLE implication (tag_id INTEGER NOT NULL, value_id INTEGER NOT NULL, implied_tag_id INTEGER NOT NULL, implied_value_id INTEGER NOT NULL);
+		INSERT INTO tag VALUES (1, 'music'), (2, 'rock'), (3, 'my tag');
+		INSERT INTO file VALUES (1, '.', 'a.mp3', '', '', 0, 0), (2, 'sub', 'b.mp3', '', '', 0, 0), (3, '.', 'c.txt', '', '', 0, 0);
+		INSERT INTO file_tag VALUES (1, 1, 0), (1, 3, 0), (2, 2, 0), (3, 3, 0);
+		INSERT INTO implication VALUES (2, 0, 1, 0);
+	""")
+	connection.commit()
+	connection.close()
+	return NautilusTMSUDatabase(str(tmp_path))
+
+
+@pytest.fixture
+def fake_tmsu(tmp_path):
+	"""
+	Create an executable standing in for tmsu that runs `script`
+	"""
+	def create(script: str):
+		path = tmp_path / "tmsu"
+		path.write_text(f"#!/bin/sh\n{script}\n")
+		path.chmod(path.stat().st_mode | stat.S_IEXEC)
+		return str(path)
+	return create
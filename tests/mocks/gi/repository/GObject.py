@@ -15,4 +15,7 @@ def threads_init():
 
 
 def timeout_add(interval, callback):
-	pass
\ No newline at end of file
+	pass
+
+def idle_add(callback, *args):
+	pass
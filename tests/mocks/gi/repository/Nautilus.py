@@ -1,5 +1,6 @@
 class Column:
-	pass
+	def __init__(self, **properties):
+		self.properties = properties
 
 
 class ColumnProvider:
@@ -31,4 +32,13 @@ class PropertiesModelProvider:
 
 
 class OperationHandle:
-	pass
\ No newline at end of file
+	pass
+
+class OperationResult:
+	COMPLETE = 0
+	FAILED = 1
+	IN_PROGRESS = 2
+
+
+def info_provider_update_complete_invoke(closure, provider, handle, result):
+	pass
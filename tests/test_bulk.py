@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from nautilus_tmsu_bulk import NautilusTMSUBulkTagger, parse_manifest_line
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def tmsu_root(tmp_path):
+	os.makedirs(tmp_path / "db" / ".tmsu")
+	(tmp_path / "db" / ".tmsu" / "db").write_text("")
+	return str(tmp_path / "db")
+
+
+def test_parse_manifest_line():
+	assert parse_manifest_line("/a/b\tone two\\ words\n") == ("/a/b", ("one", "two\\ words"))
+	assert parse_manifest_line("/a/b\tone\n", ("one", "all")) == ("/a/b", ("one", "all"))
+	assert parse_manifest_line("/a/b\n", ("all", )) == ("/a/b", ("all", ))
+	assert parse_manifest_line("# comment\n") is None
+	assert parse_manifest_line("\n") is None
+
+
+def test_groups_by_root_and_tag_set(tmsu_root, tmp_path, fake_runner):
+	runner = fake_runner
+	tagger = NautilusTMSUBulkTagger(runner, budget=len(tmsu_root) * 3 + 30)
+	for index in range(4):
+		tagger.add(os.path.join(tmsu_root, f"f{index}"), ("b", "a"))
+	tagger.add(os.path.join(tmsu_root, "g"), ("c", ))
+	tagger.add(str(tmp_path / "outside"), ("c", ))
+
+	# the first chunk filled up and went out, only one per root runs at a time
+	assert len(runner.tasks) == 1
+	command = runner.tasks[0][0]
+	assert command._cwd == tmsu_root
+	assert command._args[:2] == ("tag", "--tags=a b")
+
+	# what finish() does, without blocking on the fake runner
+	tagger._queue((tmsu_root, ("a", "b")))
+	tagger._queue((tmsu_root, ("c", )))
+	while runner.tasks:
+		runner.complete()
+	assert tagger.tagged == 5
+	assert tagger.chunks == 3
+	assert tagger.failed == [(str(tmp_path / "outside"), "not in a tmsu database")]
+
+
+def test_failed_chunks_are_reported(tmsu_root, fake_runner):
+	runner = fake_runner
+	tagger = NautilusTMSUBulkTagger(runner)
+	tagger.add(os.path.join(tmsu_root, "a"), ("x", ))
+	tagger._queue((tmsu_root, ("x", )))
+	runner.complete(None)
+	assert tagger.failed == [(os.path.join(tmsu_root, "a"), "tmsu tag failed")]
+
+
+def test_bulk_does_not_load_nautilus():
+	code = "import sys, nautilus_tmsu_bulk\nassert 'gi.repository.Nautilus' not in sys.modules, 'Nautilus imported'\n"
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]))
+	result = subprocess.run([sys.executable, "-c", code], capture_output=True, env=env)
+	assert result.returncode == 0, result.stderr.decode("UTF-8")
+
+
+def test_jobs_with_thread_backend_warns():
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]))
+	result = subprocess.run([sys.executable, "-m", "nautilus_tmsu_bulk", "--backend", "thread", "--jobs", "2", "--progress", "0"], input=b"", capture_output=True, env=env)
+	assert result.returncode == 0, result.stderr.decode("UTF-8")
+	assert b"--jobs is ignored by the thread backend" in result.stderr
+
+
+def test_backend_is_not_inherited_by_tmsu(tmsu_root, tmp_path, fake_tmsu):
+	tmsu = fake_tmsu(f"export -p > {tmp_path / 'environment'}")
+	env = {name: value for name, value in os.environ.items() if not name.startswith("NAUTILUS_TMSU_")}
+	env.update(PATH=os.path.dirname(tmsu), PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "src", "nautilus-tmsu"), os.path.join(ROOT, "tests", "mocks")]))
+	manifest = f"{os.path.join(tmsu_root, 'a')}\tx\n".encode("UTF-8")
+	result = subprocess.run([sys.executable, "-m", "nautilus_tmsu_bulk", "--jobs", "2", "--progress", "0"], input=manifest, capture_output=True, env=env)
+	assert result.returncode == 0, result.stderr.decode("UTF-8")
+	assert "NAUTILUS_TMSU_" not in (tmp_path / "environment").read_text()
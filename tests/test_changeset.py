@@ -0,0 +1,118 @@
+import queue
+
+from nautilus_tmsu_cache import NautilusTMSUTagCache
+from nautilus_tmsu_changeset import NautilusTMSUChangeSet
+from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandDelete, NautilusTMSUCommandUntag
+from nautilus_tmsu_runner import NautilusTMSURunner
+
+
+def test_untag_is_batched_per_file(file_info):
+	a = file_info("/db/a")
+	changes = NautilusTMSUChangeSet()
+	for tag in ("one", "two", "three"):
+		changes.untag(a, tag)
+
+	commands = changes.commands()
+	assert len(commands) == 1
+	command, applied = commands[0]
+	assert isinstance(command, NautilusTMSUCommandUntag)
+	assert command._args == ("untag", "--tags=one three two", "/db/a")
+	assert len(applied) == 3
+
+
+def test_untag_groups_files_losing_the_same_tags(file_info):
+	a, b, c = file_info("/db/a"), file_info("/db/b"), file_info("/db/c")
+	changes = NautilusTMSUChangeSet()
+	changes.untag(a, "one")
+	changes.untag(b, "one")
+	changes.untag(c, "two")
+
+	args = sorted(command._args for command, _ in changes.commands())
+	assert args == [
+		("untag", "--tags=one", "/db/a", "/db/b"),
+		("untag", "--tags=two", "/db/c"),
+	]
+
+
+def test_delete_is_one_command_per_root(file_info):
+	root = file_info("/db", True)
+	changes = NautilusTMSUChangeSet()
+	changes.delete(root, "one", "/db")
+	changes.delete(root, "two", "/db")
+	changes.delete(root, "one", "/db")
+
+	commands = changes.commands()
+	assert len(commands) == 1
+	assert isinstance(commands[0][0], NautilusTMSUCommandDelete)
+	assert commands[0][0]._args == ("delete", "one", "two")
+
+
+def test_commit_updates_cache_or_reports_failure(file_info, fake_tmsu, monkeypatch, tmp_path):
+	runner = NautilusTMSURunner()
+	monkeypatch.setattr(runner, "dispatcher", lambda callback, *args: callback(*args))
+	monkeypatch.setattr(NautilusTMSUCommand, "_tmsu", fake_tmsu("case \"$*\" in *fail*) exit 1;; esac"))
+	a, fail = file_info(str(tmp_path / "a")), file_info(str(tmp_path / "fail"))
+	cache = NautilusTMSUTagCache()
+	cache.set(a.path, ["one", "two"], a)
+	cache.set(fail.path, ["two"], fail)
+
+	changes = NautilusTMSUChangeSet()
+	changes.untag(a, "one")
+	failed = changes.untag(fail, "two")
+	discarded = changes.untag(a, "two")
+	changes.discard(discarded)
+	results = queue.Queue()
+	changes.commit(results.put)
+
+	assert results.get(timeout=5) == [failed]
+	assert list(changes) == [failed] and not changes.committing
+	assert cache.get(a.path) == ["two"]
+	assert a.attributes["tmsu_tags"] == "two"
+	assert cache.get(fail.path) == ["two"]
+
+
+def test_failed_changes_are_retried(file_info, fake_tmsu, monkeypatch, tmp_path):
+	runner = NautilusTMSURunner()
+	monkeypatch.setattr(runner, "dispatcher", lambda callback, *args: callback(*args))
+	# fails until the marker exists
+	marker = tmp_path / "marker"
+	monkeypatch.setattr(NautilusTMSUCommand, "_tmsu", fake_tmsu(f"[ -e '{marker}' ] || exit 1"))
+	a = file_info(str(tmp_path / "a"))
+
+	changes = NautilusTMSUChangeSet()
+	change = changes.untag(a, "one")
+	results = queue.Queue()
+	changes.commit(results.put)
+	assert results.get(timeout=5) == [change]
+	assert list(changes) == [change]
+
+	marker.touch()
+	changes.commit(results.put)
+	assert results.get(timeout=5) == []
+	assert not changes
+
+
+def test_deleted_tag_drops_every_value(tmp_path):
+	cache = NautilusTMSUTagCache()
+	a, b = str(tmp_path / "a"), str(tmp_path / "sub" / "b")
+	cache.set(a, ["year=2024", "my\\ tag", "yearly"])
+	cache.set_tagged(str(tmp_path / "sub"), ["b"])
+	cache.discard_tags(str(tmp_path), ["year"])
+	assert cache.get(a) == ["my\\ tag", "yearly"]
+	assert cache.is_tagged(b) is None
+
+	cache.remove_tags(a, ["my\\ tag"])
+	assert cache.get(a) == ["yearly"]
+
+
+def test_bulk_untag_is_grouped_by_root(file_info, monkeypatch):
+	monkeypatch.setattr("nautilus_tmsu_changeset.chunk_files", lambda files: [files[:600], files[600:]])
+	files = [file_info(f"/db/{directory}/{i}") for directory in ("x", "y") for i in range(500)]
+	changes = NautilusTMSUChangeSet()
+	for file in files:
+		changes.untag(file, "one", "/db")
+
+	commands = changes.commands()
+	assert len(commands) == 2
+	assert all(command._cwd == "/db" for command, _ in commands)
+	assert sum(len(applied) for _, applied in commands) == 1000
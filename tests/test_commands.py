@@ -0,0 +1,52 @@
+import asyncio
+
+from nautilus_tmsu_commands import NautilusTMSUCommandTags, NautilusTMSUCommandTagsBatch, chunk_files
+from nautilus_tmsu_parser import NautilusTMSUTagRecord
+
+
+def test_tags_batch_splits_output_per_file(file_info, fake_tmsu, tmp_path):
+	command = NautilusTMSUCommandTagsBatch([file_info("/db/a"), file_info("/db/b"), file_info("/db/c")], cwd=str(tmp_path))
+	command._tmsu = fake_tmsu("printf '/db/a:\\none\\ntwo\\\\ words\\n\\n/db/b:\\n\\n/db/c:\\nyear=2024\\n'")
+	assert command._args == ("tags", "-1", "--name=always", "/db/a", "/db/b", "/db/c")
+	assert command.execute() == {
+		"/db/a": ["one", "two\\ words"],
+		"/db/b": [],
+		"/db/c": ["year=2024"],
+	}
+
+
+def test_tags_batch_async_matches_execute(file_info, fake_tmsu, tmp_path):
+	command = NautilusTMSUCommandTagsBatch([file_info("/db/a"), file_info("/db/b")], cwd=str(tmp_path))
+	command._tmsu = fake_tmsu("printf '/db/a:\\none\\n/db/b:\\nmy\\\\ tag\\n'")
+	assert asyncio.run(command.execute_async()) == {"/db/a": ["one"], "/db/b": ["my\\ tag"]}
+
+
+def test_tag_records_arrive_while_tmsu_runs(file_info, fake_tmsu, tmp_path):
+	command = NautilusTMSUCommandTagsBatch([file_info("/db/a")], cwd=str(tmp_path))
+	command._tmsu = fake_tmsu("printf '/db/a:\\none\\n'; exec sleep 30")
+	records = command._records()
+	assert next(records) == NautilusTMSUTagRecord("/db/a", ["one"])
+	records.close()
+	assert command._process.returncode is not None
+
+
+def test_tags_batch_failure_returns_empty_tags(file_info, fake_tmsu, tmp_path):
+	command = NautilusTMSUCommandTagsBatch([file_info("/db/a")], cwd=str(tmp_path))
+	command._tmsu = fake_tmsu("echo '/db/a:'; echo one; echo 'tmsu: /db/b: no such file' >&2; exit 1")
+	assert command.execute() == {"/db/a": []}
+
+
+def test_tags_keeps_every_tag_of_a_single_file(file_info, fake_tmsu, tmp_path):
+	# with or without the file name header, nothing is dropped
+	command = NautilusTMSUCommandTags(file_info(str(tmp_path / "a")))
+	command._tmsu = fake_tmsu("printf 'one\\nmy\\\\ tag=a\\\\=b\\n'")
+	assert command.execute() == ["one", "my\\ tag=a\\=b"]
+	command._tmsu = fake_tmsu(f"printf '{tmp_path / 'a'}:\\none\\n'")
+	assert command.execute() == ["one"]
+
+
+def test_chunk_files_respects_budget(file_info):
+	files = [file_info(f"/db/{i:04}") for i in range(100)]
+	chunks = list(chunk_files(files, budget=100))
+	assert [file for chunk in chunks for file in chunk] == files
+	assert all(sum(len(file.path) + 1 for file in chunk) <= 100 for chunk in chunks)
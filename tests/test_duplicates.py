@@ -0,0 +1,95 @@
+import os
+import sqlite3
+
+from nautilus_tmsu_duplicates import NautilusTMSUCommandDuplicates
+
+
+def write(path, content: bytes) -> str:
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, "wb") as file:
+		file.write(content)
+	return str(path)
+
+
+def find(paths, cache_path):
+	batches = []
+	command = NautilusTMSUCommandDuplicates(paths, lambda command, groups: batches.append(groups), cache_path=cache_path, batch_interval=0)
+	return command, command.execute(), [group for batch in batches for group in batch]
+
+
+def test_duplicates_are_grouped_largest_first(tmp_path):
+	root = tmp_path / "root"
+	a = write(root / "a", b"same content")
+	b = write(root / "sub" / "b", b"same content")
+	write(root / "c", b"other conten")
+	d = write(root / "d", b"xx")
+	e = write(root / "sub" / "e", b"xx")
+	write(root / ".tmsu" / "db", b"xx")
+	write(root / "empty1", b"")
+	write(root / "empty2", b"")
+	os.symlink(a, root / "link")
+
+	command, count, groups = find([str(root)], str(tmp_path / "cache.db"))
+	assert count == 2
+	assert groups == [(12, [a, b]), (2, [d, e])]
+	# the lone file of size 12 without a twin is read, the 2 byte files too
+	assert command.hashed == 5
+
+
+def test_unchanged_files_are_not_read_again(tmp_path):
+	root = tmp_path / "root"
+	a = write(root / "a", b"one")
+	b = write(root / "b", b"one")
+	c = write(root / "c", b"two")
+	cache_path = str(tmp_path / "cache.db")
+	find([str(root)], cache_path)
+
+	write(root / "c", b"one")
+	os.utime(c, ns=(0, 0))
+	command, count, groups = find([str(root)], cache_path)
+	assert groups == [(3, [a, b, c])]
+	assert (command.hashed, command.cached) == (1, 2)
+
+
+def test_removed_files_are_pruned_from_the_cache(tmp_path):
+	root = tmp_path / "root"
+	write(root / "a", b"one")
+	b = write(root / "b", b"one")
+	cache_path = str(tmp_path / "cache.db")
+	find([str(root)], cache_path)
+
+	os.remove(b)
+	find([str(root)], cache_path)
+	connection = sqlite3.connect(cache_path)
+	assert [path for (path, ) in connection.execute("SELECT path FROM fingerprint")] == [str(root / "a")]
+	connection.close()
+
+
+def test_unlisted_directories_are_not_pruned(monkeypatch, tmp_path):
+	root = tmp_path / "root"
+	a = write(root / "a", b"one")
+	b = write(root / "sub" / "b", b"one")
+	cache_path = str(tmp_path / "cache.db")
+	find([str(root)], cache_path)
+
+	scandir = os.scandir
+	def failing_scandir(path):
+		if path == str(root / "sub"):
+			raise PermissionError(path)
+		return scandir(path)
+	monkeypatch.setattr(os, "scandir", failing_scandir)
+	find([str(root)], cache_path)
+	connection = sqlite3.connect(cache_path)
+	assert sorted(path for (path, ) in connection.execute("SELECT path FROM fingerprint")) == [a, b]
+	connection.close()
+
+
+def test_cancelled_search_reports_nothing(tmp_path):
+	root = tmp_path / "root"
+	write(root / "a", b"one")
+	write(root / "b", b"one")
+	batches = []
+	command = NautilusTMSUCommandDuplicates([str(root)], lambda command, groups: batches.append(groups), cache_path=str(tmp_path / "cache.db"))
+	command.cancel()
+	assert command.execute() is None
+	assert batches == []
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from gi.repository import Nautilus # type: ignore
+
+from nautilus_tmsu_cache import NautilusTMSUTagCache
+from nautilus_tmsu_column import NautilusTMSUColumn
+from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandTagged
+
+
+@pytest.fixture
+def column(monkeypatch, tmp_path, fake_runner):
+	def create(mode: str):
+		monkeypatch.setenv("NAUTILUS_TMSU_COLUMN_MODE", mode)
+		monkeypatch.setattr("nautilus_tmsu_column.find_tmsu_root", lambda file, **kwargs: str(tmp_path))
+		completed = []
+		monkeypatch.setattr(Nautilus, "info_provider_update_complete_invoke", lambda closure, provider, handle, result: completed.append(handle), raising=False)
+		column = NautilusTMSUColumn()
+		column._runner = fake_runner
+		return column, completed
+	return create
+
+
+def test_database_tagged_names(database):
+	assert database.tagged_names(database.root) == {"a.mp3", "c.txt"}
+	assert database.tagged_names(os.path.join(database.root, "sub")) == {"b.mp3"}
+
+
+def test_tagged_command_keeps_direct_entries(tmp_path, fake_tmsu):
+	command = NautilusTMSUCommandTagged(str(tmp_path))
+	command._tmsu = fake_tmsu("printf './a\\0./b c\\0./sub/d\\0'")
+	assert command.execute() == {"a", "b c"}
+
+
+def test_emblems_use_one_query_per_directory(column, database, file_info):
+	column, completed = column("emblems")
+	files = [file_info(os.path.join(database.root, name)) for name in ("a.mp3", "c.txt", "new.txt")]
+	for handle, file in enumerate(files):
+		assert column.update_file_info_full(None, handle, None, file) == Nautilus.OperationResult.IN_PROGRESS
+	assert len(column._runner.tasks) == 1
+
+	command, callback, callback_args = column._runner.tasks.pop()
+	callback(command, command.execute(), *callback_args)
+	assert completed == [0, 1, 2]
+	assert [file.emblems for file in files] == [["emblem-default"], ["emblem-default"], []]
+	# answered from the set without another query, and no per file tag lookup
+	again = file_info(os.path.join(database.root, "a.mp3"))
+	assert column.update_file_info_full(None, 3, None, again) == Nautilus.OperationResult.COMPLETE
+	assert again.emblems == ["emblem-default"] and not column._runner.tasks
+
+
+def test_both_mode_only_looks_up_tagged_files(column, database, file_info):
+	column, completed = column("both")
+	NautilusTMSUTagCache().set_tagged(database.root, {"a.mp3"})
+	tagged = file_info(os.path.join(database.root, "a.mp3"))
+	untagged = file_info(os.path.join(database.root, "c.txt"))
+	assert column.update_file_info_full(None, 0, None, tagged) == Nautilus.OperationResult.IN_PROGRESS
+	assert column.update_file_info_full(None, 1, None, untagged) == Nautilus.OperationResult.COMPLETE
+	assert len(column._runner.tasks) == 1
+	assert column._runner.tasks[0][0]._args[:2] == ("tags", "-1")
+
+
+def test_cache_keeps_tagged_sets_current(tmp_path):
+	cache = NautilusTMSUTagCache()
+	directory = str(tmp_path)
+	assert cache.is_tagged(os.path.join(directory, "a")) is None
+	cache.set_tagged(directory, {"a"})
+	cache.set(os.path.join(directory, "b"), ["x"])
+	assert cache.is_tagged(os.path.join(directory, "b"))
+	cache.remove_tags(os.path.join(directory, "b"), ["x"])
+	assert cache.is_tagged(os.path.join(directory, "b")) is False
+	cache.invalidate(os.path.join(directory, "a"))
+	assert cache.is_tagged(os.path.join(directory, "a")) is None
+
+
+def test_failed_lookup_is_not_cached(column, file_info, fake_tmsu, monkeypatch, tmp_path):
+	column, completed = column("tags")
+	monkeypatch.setattr(NautilusTMSUCommand, "_tmsu", fake_tmsu("exit 1"))
+	file = file_info(str(tmp_path / "a"))
+	assert column.update_file_info_full(None, 0, None, file) == Nautilus.OperationResult.IN_PROGRESS
+
+	command, callback, callback_args = column._runner.tasks.pop()
+	callback(command, command.execute(), *callback_args)
+	assert completed == [0]
+	assert NautilusTMSUTagCache().get(file.path) is None
+
+
+def test_emblems_mode_has_no_tags_column(column):
+	assert column("emblems")[0].get_columns() == []
+	assert [c.properties["attribute"] for c in column("both")[0].get_columns()] == ["tmsu_tags"]
@@ -1,7 +1,32 @@
+import os
+import subprocess
+import sys
+
 import pytest
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
 def test_nautilus_tmsu_import():
 	try:
 		import nautilus_tmsu
 	except ImportError as e:
-		pytest.fail(f"Import failed: {e}")
\ No newline at end of file
+		pytest.fail(f"Import failed: {e}")
+
+
+def test_nautilus_tmsu_import_is_lazy():
+	# run in a fresh interpreter so modules imported by other tests don't leak in
+	code = (
+		"import sys, nautilus_tmsu\n"
+		"from nautilus_tmsu_runner import NautilusTMSURunner\n"
+		"from nautilus_tmsu_commands import NautilusTMSUCommand\n"
+		"assert 'nautilus_tmsu_dialog' not in sys.modules\n"
+		"assert 'gi.repository.Adw' not in sys.modules\n"
+		"assert 'sqlite3' not in sys.modules\n"
+		"assert 'asyncio' not in sys.modules\n"
+		"assert NautilusTMSUCommand._tmsu is None\n"
+		"assert not NautilusTMSURunner().started\n"
+	)
+	env = dict(os.environ, PATH="", PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "src"), os.path.join(ROOT, "tests", "mocks")]))
+	result = subprocess.run([sys.executable, "-c", code], capture_output=True, env=env)
+	assert result.returncode == 0, result.stderr.decode("UTF-8")
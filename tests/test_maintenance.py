@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from nautilus_tmsu_commands import NautilusTMSUCommandRepair, NautilusTMSUCommandStatus
+from nautilus_tmsu_maintenance import NautilusTMSUCommandPlan, NautilusTMSUMaintenance
+
+
+@pytest.fixture
+def root(tmp_path):
+	for name in ("a", "b"):
+		os.mkdir(tmp_path / name)
+	for name in ("x.txt", "y.txt", os.path.join("a", "1.txt")):
+		(tmp_path / name).write_text("")
+	os.mkdir(tmp_path / ".tmsu")
+	return str(tmp_path)
+
+
+def test_status_runs_per_batch_only_when_idle(root, fake_runner):
+	runner = fake_runner
+	maintenance = NautilusTMSUMaintenance(runner)
+	state = maintenance.watch(root)
+
+	maintenance._tick()
+	assert runner.tasks == []
+
+	runner.idle_time = maintenance.idle_delay
+	maintenance._tick()
+	assert isinstance(runner.tasks[0][0], NautilusTMSUCommandPlan)
+	runner.execute()
+	command = runner.tasks[0][0]
+	assert isinstance(command, NautilusTMSUCommandStatus)
+	assert command._args == ("status", os.path.join(root, "x.txt"), os.path.join(root, "y.txt"), os.path.join(root, "a", "1.txt"))
+	assert command._low_priority
+
+	runner.complete({'modified': [os.path.join(root, "x.txt")], 'missing': [os.path.join(root, "a", "1.txt")]})
+	assert runner.tasks == []
+	assert set(runner.priorities) == {"idle"}
+	assert state.directories is None
+	assert state.checked is not None
+	assert state.summary.endswith("1 modified, 1 missing")
+
+
+def test_plan_stops_once_a_batch_is_full(root):
+	first = [os.path.join(root, "x.txt"), os.path.join(root, "y.txt")]
+	units, directories = NautilusTMSUCommandPlan(root, [root], budget=sum(len(path) + 1 for path in first)).execute()
+	assert units == [first, [os.path.join(root, "a", "1.txt")]]
+	assert directories == [os.path.join(root, "b")]
+
+
+def test_plan_includes_entries_gone_from_disk(database):
+	root = database.root
+	assert database.entries(root) == {"a.mp3", "c.txt", "sub"}
+	assert database.entries(os.path.join(root, "sub")) == {"b.mp3"}
+	units, directories = NautilusTMSUCommandPlan(root, [root]).execute()
+	assert units == [[os.path.join(root, name) for name in ("a.mp3", "c.txt", "sub")]]
+	assert directories == []
+
+
+def test_pause_resumes_from_interrupted_batch(root, fake_runner):
+	runner = fake_runner
+	maintenance = NautilusTMSUMaintenance(runner)
+	state = maintenance.watch(root)
+	runner.idle_time = maintenance.idle_delay
+	maintenance._tick()
+	runner.execute()
+
+	interrupted = runner.tasks[0][0]
+	maintenance.pause()
+	assert not interrupted.can_run
+	assert not state.running
+	assert state.summary == "Checking, 0 of 1 batches done, 0 folders to go, continues when idle"
+
+	# the cancelled command finishing late is ignored
+	runner.complete(None)
+	assert len(state.units) == 1
+
+	maintenance._tick()
+	assert runner.tasks[0][0]._args == interrupted._args
+
+
+def test_repair_when_requested(root, fake_runner):
+	runner = fake_runner
+	maintenance = NautilusTMSUMaintenance(runner)
+	maintenance.watch(root).checked = 0.0
+	maintenance.request_repair(root)
+	runner.idle_time = maintenance.idle_delay
+	maintenance._tick()
+	# tmsu searches positional paths for moved files, the repair is scoped instead
+	command = runner.tasks[0][0]
+	assert isinstance(command, NautilusTMSUCommandRepair)
+	assert command._args == ("repair", f"--path={root}")
+
+	runner.complete(["x.txt: updated fingerprint"])
+	assert runner.tasks == []
+	assert not maintenance.state(root).repair_requested
+	assert maintenance.state(root).findings['repaired'] == ["x.txt: updated fingerprint"]
+
+
+def test_status_command_collects_findings(tmp_path, fake_tmsu):
+	command = NautilusTMSUCommandStatus([str(tmp_path)], str(tmp_path))
+	command._tmsu = fake_tmsu("printf 'T ./a\\nM ./b c\\n! /gone/d\\nU ./e\\n'")
+	assert command.execute() == {'modified': [str(tmp_path / "b c")], 'missing': ["/gone/d"]}
@@ -0,0 +1,75 @@
+import glob
+import json
+import os
+import random
+
+import pytest
+
+from nautilus_tmsu_parser import NautilusTMSUTagParser, NautilusTMSUTagRecord, format_tag, parse_tags, split_tag
+from nautilus_tmsu_utils import format_tags
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tags")
+GOLDEN = sorted(glob.glob(os.path.join(DATA, "*.out")))
+
+
+def chunks(data: bytes, size: int):
+	return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+def fields(records):
+	return [(record.path, tag, value) for record in records for tag, value in record.fields()]
+
+
+@pytest.mark.parametrize("path", GOLDEN, ids=[os.path.basename(path) for path in GOLDEN])
+@pytest.mark.parametrize("size", [1, 3, 64, 65536])
+def test_golden_output(path, size):
+	with open(path, "rb") as file:
+		data = file.read()
+	with open(path[:-len(".out")] + ".json", encoding="UTF-8") as file:
+		expected = [tuple(record) for record in json.load(file)]
+	assert fields(parse_tags(chunks(data, size))) == expected
+
+
+def test_split_and_format_tag():
+	assert split_tag("plain") == ("plain", None)
+	assert split_tag("year=2024") == ("year", "2024")
+	assert split_tag("a\\=b=c\\ d") == ("a=b", "c d")
+	assert split_tag("ends\\\\=v") == ("ends\\", "v")
+	assert format_tag("a=b", "c d") == "a\\=b=c\\ d"
+	assert format_tags(["my\\ tag", "year=2024", "back\\\\slash"]) == "my tag, year=2024, back\\slash"
+
+
+def test_unterminated_line_is_kept_until_close():
+	parser = NautilusTMSUTagParser("/a")
+	assert parser.feed(b"one\ntw") == [NautilusTMSUTagRecord("/a", ["one"])]
+	assert parser.feed(b"o") == []
+	assert parser.feed(b"\r\n/b\\:c:\nthree") == [NautilusTMSUTagRecord("/a", ["two"])]
+	assert parser.close() == [NautilusTMSUTagRecord("/b:c", ["three"])]
+
+
+def test_fuzz_round_trip():
+	# printed the way tmsu does and parsed back in random chunks
+	rng = random.Random(36)
+	alphabet = "ab =:\\\\é\t()"
+	for _ in range(300):
+		expected = []
+		output = []
+		for _ in range(rng.randint(1, 4)):
+			path = "/" + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+			output.append(path.replace("\\", "\\\\").replace(":", "\\:") + ":")
+			for _ in range(rng.randint(0, 4)):
+				tag = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 8)))
+				value = rng.choice([None, "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))])
+				if value == "":
+					value = None
+				expected.append((path, format_tag(tag, value), tag, value))
+				output.append(format_tag(tag, value))
+			output.append("")
+		data = "\n".join(output).encode("UTF-8")
+		records = list(parse_tags(chunks(data, rng.randint(1, 16))))
+		assert [(record.path, text, *split_tag(text)) for record in records for text in record.tags] == expected
+
+
+def test_invalid_utf8_is_kept():
+	records = list(parse_tags(b"/a\xff:\ntag\xfe\n"))
+	assert fields(records) == [("/a\udcff", "tag\udcfe", None)]
@@ -0,0 +1,221 @@
+import configparser
+import os
+import time
+
+import pytest
+
+from gi.repository import Nautilus # type: ignore
+
+from nautilus_tmsu_column import look_up_tags, NautilusTMSUColumn
+from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandTagsDirectory
+from nautilus_tmsu_policy import NautilusTMSURootPolicy, filesystem_type
+from nautilus_tmsu_runner import NautilusTMSUCommandRoots, find_tmsu_root, forget_tmsu_roots
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+40 22 0:35 / /mnt/nas rw,relatime shared:20 - nfs4 nas:/export rw
+41 40 0:36 / /mnt/nas/my\\040photos rw,relatime shared:21 - fuse.sshfs host:/photos rw
+"""
+
+
+def configure(monkeypatch, text: str) -> None:
+	config = configparser.ConfigParser(interpolation=None)
+	config.read_string(text)
+	monkeypatch.setattr("nautilus_tmsu_config.load_config", lambda: config)
+
+
+def test_filesystem_type_uses_longest_mount_point(tmp_path):
+	mountinfo = tmp_path / "mountinfo"
+	mountinfo.write_text(MOUNTINFO)
+	assert filesystem_type("/home/user", str(mountinfo)) == "ext4"
+	assert filesystem_type("/mnt/nas/docs", str(mountinfo)) == "nfs4"
+	assert filesystem_type("/mnt/nas/my photos/2024", str(mountinfo)) == "fuse.sshfs"
+	assert filesystem_type("/mnt/nasty", str(mountinfo)) == "ext4"
+
+
+def test_strategy_follows_filesystem_and_latency():
+	assert NautilusTMSURootPolicy("/data", "ext4").strategy == "local"
+	remote = NautilusTMSURootPolicy("/mnt/nas", "nfs4")
+	assert remote.strategy == "batched" and remote.ttl == 300 and remote.concurrency == 2
+
+	slow = NautilusTMSURootPolicy("/data", "ext4")
+	slow.record(0.5)
+	assert slow.strategy == "batched"
+	for _ in range(20):
+		slow.record(5.0)
+	assert slow.lazy
+
+
+def test_root_overrides(monkeypatch):
+	configure(monkeypatch, "[root:/mnt/nas]\nstrategy = local\n\n[root:/data]\nttl = 5\nconcurrency = 1\n")
+	assert NautilusTMSURootPolicy("/mnt/nas/", "nfs4").strategy == "local"
+	policy = NautilusTMSURootPolicy("/data", "ext4")
+	assert (policy.strategy, policy.ttl, policy.concurrency) == ("local", 5, 1)
+
+
+def test_root_is_looked_up_once_per_directory(monkeypatch, tmp_path, file_info):
+	calls = []
+	watched = []
+	monkeypatch.setattr(NautilusTMSUCommand, "_run", lambda self: calls.append(self._cwd) or f"Root path: {tmp_path}\n")
+	# roots are looked up on workers, maintenance is handed the root on the main loop
+	monkeypatch.setattr("nautilus_tmsu_runner.GObject.idle_add", lambda callback, *args: watched.append(args))
+	directory = str(tmp_path / "sub")
+	try:
+		assert find_tmsu_root(file_info(os.path.join(directory, "a"))) == str(tmp_path)
+		assert find_tmsu_root(file_info(os.path.join(directory, "b"))) == str(tmp_path)
+		assert calls == [directory]
+		assert watched == [(str(tmp_path), )]
+	finally:
+		forget_tmsu_roots()
+
+
+def test_root_found_without_running_tmsu(monkeypatch, tmp_path, file_info):
+	monkeypatch.setattr(NautilusTMSUCommand, "_run", lambda self: pytest.fail("tmsu run on the main loop"))
+	monkeypatch.setattr("nautilus_tmsu_runner.GObject.idle_add", lambda callback, *args: None)
+	os.makedirs(tmp_path / ".tmsu")
+	(tmp_path / ".tmsu" / "db").touch()
+	try:
+		assert find_tmsu_root(file_info(str(tmp_path / "sub" / "a")), run_tmsu=False) == str(tmp_path)
+	finally:
+		forget_tmsu_roots()
+
+
+def test_roots_command_groups_files(monkeypatch, tmp_path, file_info):
+	database = str(tmp_path / "db")
+	monkeypatch.setattr(NautilusTMSUCommand, "_run", lambda self: f"Root path: {database}\n" if self._cwd.startswith(database) else None)
+	files = [file_info(os.path.join(database, "a")), file_info(str(tmp_path / "outside")), file_info(os.path.join(database, "sub", "b"))]
+	try:
+		assert NautilusTMSUCommandRoots(files).execute() == {database: [files[0], files[2]]}
+	finally:
+		forget_tmsu_roots()
+
+def batched_column(monkeypatch, tmp_path, fake_runner, completed: list) -> NautilusTMSUColumn:
+	monkeypatch.setenv("NAUTILUS_TMSU_COLUMN_MODE", "tags")
+	monkeypatch.setattr("nautilus_tmsu_column.find_tmsu_root", lambda file, **kwargs: str(tmp_path))
+	configure(monkeypatch, f"[root:{tmp_path}]\nstrategy = batched\nconcurrency = 1\n")
+	monkeypatch.setattr(Nautilus, "info_provider_update_complete_invoke", lambda closure, provider, handle, result: completed.append(handle), raising=False)
+	column = NautilusTMSUColumn()
+	column._runner = fake_runner
+	return column
+
+
+def test_batched_root_prefetches_the_directory(monkeypatch, tmp_path, file_info, fake_runner):
+	completed = []
+	column = batched_column(monkeypatch, tmp_path, fake_runner, completed)
+	for name in ("a", "b", "c", "d"):
+		(tmp_path / name).touch()
+
+	files = [file_info(str(tmp_path / name)) for name in ("a", "b", "c")]
+	for handle, file in enumerate(files):
+		assert column.update_file_info_full(None, handle, None, file) == Nautilus.OperationResult.IN_PROGRESS
+	# the first file brings in its directory, the rest wait for it
+	assert len(fake_runner.tasks) == 1
+	command, callback, callback_args = fake_runner.tasks.pop()
+	assert isinstance(command, NautilusTMSUCommandTagsDirectory)
+	command._list()
+	assert command.paths == [str(tmp_path / name) for name in ("a", "b", "c", "d")]
+
+	command.elapsed = 2.0
+	callback(command, {path: (["x"] if path.endswith("a") else []) for path in command.paths}, *callback_args)
+	assert completed == [0, 1, 2] and not fake_runner.tasks
+	assert files[0].attributes == {"tmsu_tags": "x"}
+	assert column._policies.get(str(tmp_path)).latency == 0.5
+	# siblings nobody asked for yet are answered from the cache
+	assert column.update_file_info_full(None, 3, None, file_info(str(tmp_path / "d"))) == Nautilus.OperationResult.COMPLETE
+
+
+def test_batched_root_collects_files_while_a_batch_runs(monkeypatch, tmp_path, file_info, fake_runner):
+	completed = []
+	column = batched_column(monkeypatch, tmp_path, fake_runner, completed)
+	column._prefetched[str(tmp_path)] = time.monotonic()
+
+	files = [file_info(str(tmp_path / name)) for name in ("a", "b", "c")]
+	for handle, file in enumerate(files):
+		assert column.update_file_info_full(None, handle, None, file) == Nautilus.OperationResult.IN_PROGRESS
+	assert len(fake_runner.tasks) == 1
+
+	command, callback, callback_args = fake_runner.tasks.pop()
+	callback(command, {str(tmp_path / "a"): ["x"]}, *callback_args)
+	assert completed == [0] and files[0].attributes == {"tmsu_tags": "x"}
+	command, callback, callback_args = fake_runner.tasks.pop()
+	assert command._args[-2:] == (str(tmp_path / "b"), str(tmp_path / "c"))
+	callback(command, {}, *callback_args)
+	assert completed == [0, 1, 2]
+
+
+def test_failed_batch_is_not_cached(monkeypatch, tmp_path, file_info, fake_runner):
+	completed = []
+	column = batched_column(monkeypatch, tmp_path, fake_runner, completed)
+	column._prefetched[str(tmp_path)] = time.monotonic()
+	path = str(tmp_path / "a")
+
+	column.update_file_info_full(None, 0, None, file_info(path))
+	command, callback, callback_args = fake_runner.tasks.pop()
+	command.failed = True
+	command.elapsed = 30.0
+	callback(command, {path: []}, *callback_args)
+	assert completed == [0]
+	assert column._cache.get(path) is None
+	assert column._policies.get(str(tmp_path)).latency is None
+
+
+def test_strategy_stays_batched_once_slow():
+	policy = NautilusTMSURootPolicy("/data", "ext4")
+	policy.record(0.5)
+	# a batch of a hundred files is quick per file, but only because it's a batch
+	for _ in range(20):
+		policy.record(1.0, 100)
+	assert policy.latency < policy.batched_latency
+	assert policy.strategy == "batched"
+
+
+def test_lazy_root_is_probed_now_and_then(monkeypatch):
+	policy = NautilusTMSURootPolicy("/data", "ext4")
+	policy.record(policy.lazy_latency)
+	assert policy.lazy
+	# just timed, then once per interval
+	assert not policy.probe()
+	policy._measured -= policy.probe_interval
+	assert policy.probe()
+	assert not policy.probe()
+
+	configure(monkeypatch, "[root:/data]\nstrategy = lazy\n")
+	policy._measured -= policy.probe_interval
+	assert not policy.probe()
+
+
+def test_cancelled_lookup_is_not_timed(monkeypatch, tmp_path, file_info, fake_runner):
+	configure(monkeypatch, f"[root:{tmp_path}]\nstrategy = local\n")
+	monkeypatch.setenv("NAUTILUS_TMSU_COLUMN_MODE", "tags")
+	monkeypatch.setattr("nautilus_tmsu_column.find_tmsu_root", lambda file, **kwargs: str(tmp_path))
+	column = NautilusTMSUColumn()
+	column._runner = fake_runner
+	assert column.update_file_info_full(None, 0, None, file_info(str(tmp_path / "a"))) == Nautilus.OperationResult.IN_PROGRESS
+	column.cancel_update(None, 0)
+
+	command = fake_runner.tasks[0][0]
+	command.elapsed = 30.0
+	fake_runner.complete(None)
+	assert column._policies.get(str(tmp_path)).latency is None
+
+
+def test_look_up_tags_fills_the_cache_of_a_lazy_root(monkeypatch, tmp_path, file_info, fake_runner):
+	configure(monkeypatch, f"[root:{tmp_path}]\nstrategy = lazy\n")
+	monkeypatch.setenv("NAUTILUS_TMSU_COLUMN_MODE", "emblems")
+	monkeypatch.setattr("nautilus_tmsu_column.find_tmsu_root", lambda file, **kwargs: str(tmp_path))
+	monkeypatch.setattr("nautilus_tmsu_column.NautilusTMSURunner", lambda: fake_runner)
+	files = [file_info(str(tmp_path / "a")), file_info(str(tmp_path / "b"))]
+	column = NautilusTMSUColumn()
+	assert column.update_file_info_full(None, 0, None, files[0]) == Nautilus.OperationResult.COMPLETE
+	assert not files[0].emblems and not fake_runner.tasks
+
+	look_up_tags(files)
+	fake_runner.complete({str(tmp_path): files})
+	command, callback, callback_args = fake_runner.tasks.pop()
+	command.elapsed = 1.0
+	callback(command, {files[0].path: ["x"], files[1].path: []}, *callback_args)
+	assert files[0].attributes == {"tmsu_tags": "x"} and files[0].invalidated == 1
+	assert column._policies.get(str(tmp_path)).latency == 0.5
+
+	assert column.update_file_info_full(None, 1, None, files[0]) == Nautilus.OperationResult.COMPLETE
+	assert files[0].emblems == [column._emblem]
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+
+from nautilus_tmsu_commands import NautilusTMSUCommandFiles
+from nautilus_tmsu_database import parse_simple_query
+
+
+def test_parse_simple_query():
+	assert parse_simple_query("music rock") == ["music", "rock"]
+	assert parse_simple_query("my\\ tag and rock") == ["my tag", "rock"]
+	assert parse_simple_query("music or rock") is None
+	assert parse_simple_query("not music") is None
+	assert parse_simple_query("year=2024") is None
+	assert parse_simple_query("(music)") is None
+
+
+def test_database_files_follow_implications(database):
+	root = database.root
+	assert sorted(database.files(["music"])) == [os.path.join(root, "a.mp3"), os.path.join(root, "sub", "b.mp3")]
+	assert list(database.files(["music", "my tag"])) == [os.path.join(root, "a.mp3")]
+
+
+def test_files_command_prefers_database(database):
+	batches = []
+	command = NautilusTMSUCommandFiles("my\\ tag", database.root, lambda command, paths: batches.append(paths), database=database)
+	assert command.execute() == 2
+	assert sorted(path for batch in batches for path in batch) == [os.path.join(database.root, name) for name in ("a.mp3", "c.txt")]
+
+
+def test_files_command_leaves_value_implications_to_tmsu(database, fake_tmsu):
+	connection = sqlite3.connect(os.path.join(database.root, ".tmsu", "db"))
+	connection.execute("INSERT INTO implication VALUES (3, 1, 2, 0)")
+	connection.commit()
+	connection.close()
+	batches = []
+	command = NautilusTMSUCommandFiles("rock", database.root, lambda command, paths: batches.append(paths), database=database)
+	command._tmsu = fake_tmsu("printf './sub/b.mp3\\0'")
+	assert command.execute() == 1
+	assert batches == [[os.path.join(database.root, "sub", "b.mp3")]]
+
+
+def test_files_command_streams_pipe_with_limit(tmp_path, fake_tmsu):
+	command = NautilusTMSUCommandFiles("music or rock", str(tmp_path), lambda command, paths: batches.append(paths), limit=3, batch_interval=0)
+	command._tmsu = fake_tmsu("printf './a\\0./b c\\0/abs/d\\0./e\\0'")
+	batches = []
+	assert command.execute() == 3
+	assert command.truncated
+	assert batches == [[str(tmp_path / "a")], [str(tmp_path / "b c")], ["/abs/d"]]
+
+
+def test_files_command_exactly_at_limit_is_complete(tmp_path, fake_tmsu):
+	command = NautilusTMSUCommandFiles("music or rock", str(tmp_path), lambda command, paths: None, limit=2)
+	command._tmsu = fake_tmsu("printf './a\\0./b\\0'")
+	assert command.execute() == 2
+	assert not command.truncated
+
+
+def test_files_command_reports_failure(tmp_path, fake_tmsu):
+	command = NautilusTMSUCommandFiles("music", str(tmp_path), lambda command, paths: None)
+	command._tmsu = fake_tmsu("echo 'no such tag' >&2; exit 1")
+	assert command.execute() is None
+
+
+def test_files_command_cancel_stops_reading(tmp_path, fake_tmsu):
+	def on_results(command, paths):
+		batches.append(paths)
+		command.cancel()
+
+	command = NautilusTMSUCommandFiles("music", str(tmp_path), on_results, batch_interval=0)
+	command._tmsu = fake_tmsu("while true; do printf './a\\0'; done")
+	batches = []
+	assert command.execute() == 1
+	assert batches == [[str(tmp_path / "a")]]
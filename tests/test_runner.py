@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+
+from nautilus_tmsu_commands import NautilusTMSUCommand, NautilusTMSUCommandLines
+from nautilus_tmsu_runner import NautilusTMSURunner, runner_backend
+from nautilus_tmsu_runner_async import CONCURRENCY, NautilusTMSUAsyncRunner, runner_concurrency
+
+
+def async_runner(monkeypatch):
+	runner = NautilusTMSUAsyncRunner()
+	results = queue.Queue()
+	monkeypatch.setattr(runner, "dispatcher", lambda callback, *args: callback(*args))
+	return runner, results
+
+
+def test_runner_backend_is_configurable(monkeypatch):
+	monkeypatch.setenv("NAUTILUS_TMSU_RUNNER_BACKEND", "asyncio")
+	assert runner_backend() is NautilusTMSUAsyncRunner
+	monkeypatch.setenv("NAUTILUS_TMSU_RUNNER_BACKEND", "thread")
+	assert runner_backend() is NautilusTMSURunner
+	assert NautilusTMSUAsyncRunner() is NautilusTMSUAsyncRunner()
+
+
+def test_async_runner_runs_commands_concurrently(monkeypatch, fake_tmsu, tmp_path):
+	runner, results = async_runner(monkeypatch)
+	started = tmp_path / "started"
+	started.mkdir()
+	# every child waits until all of them started, which only happens when they run at once
+	tmsu = fake_tmsu(f"touch {started}/$2; for i in $(seq 100); do [ $(ls {started} | wc -l) -ge {runner.concurrency} ] && break; sleep 0.05; done; ls {started} | wc -l")
+	for index in range(runner.concurrency):
+		command = NautilusTMSUCommand("tags", str(index))
+		command._tmsu = tmsu
+		runner.add(command, lambda command, result, index: results.put((index, result)), index)
+
+	received = sorted(results.get(timeout=30) for _ in range(runner.concurrency))
+	assert received == [(index, f"{runner.concurrency}\n") for index in range(runner.concurrency)]
+
+
+def test_async_runner_cancel_terminates_child(monkeypatch, fake_tmsu):
+	runner, results = async_runner(monkeypatch)
+	command = NautilusTMSUCommandLines("status")
+	command._tmsu = fake_tmsu("echo started; exec sleep 30")
+	runner.add(command, lambda command, result: results.put(result), priority="background")
+
+	while command._process is None:
+		time.sleep(0.01)
+	command.cancel()
+	# the child is gone long before its sleep ends
+	assert results.get(timeout=10) is None
+	assert command._process.returncode is not None
+
+
+def test_cancel_before_start_kills_child(fake_tmsu):
+	command = NautilusTMSUCommandLines("status")
+	command._tmsu = fake_tmsu("exec sleep 30")
+	command.cancel()
+	assert command.execute() is None
+	assert command._process.returncode is not None
+
+
+def test_runner_concurrency_falls_back_on_invalid_values(monkeypatch):
+	for value, expected in (("8", 8), ("", CONCURRENCY), ("many", CONCURRENCY), ("0", CONCURRENCY)):
+		monkeypatch.setenv("NAUTILUS_TMSU_RUNNER_CONCURRENCY", value)
+		assert runner_concurrency() == expected
+
+
+def test_user_work_pauses_maintenance(monkeypatch):
+	class FakeMaintenance(object):
+		paused = 0
+
+		def pause(self):
+			self.paused += 1
+
+	runner = NautilusTMSURunner()
+	monkeypatch.setattr(runner, "_maintenance", FakeMaintenance())
+	for priority in ("interactive", "background", "duplicates", "idle"):
+		command = NautilusTMSUCommand("status")
+		command.cancel()
+		runner.add(command, priority=priority)
+	assert runner._maintenance.paused == 3
+
+
+def test_duplicate_search_does_not_hold_up_background_work(monkeypatch):
+	class Search(NautilusTMSUCommand):
+		def execute(self):
+			release.wait(10)
+			return "search"
+
+	runner = NautilusTMSURunner()
+	results = queue.Queue()
+	release = threading.Event()
+	monkeypatch.setattr(runner, "dispatcher", lambda callback, *args: callback(*args))
+	runner.add(Search(), lambda command, result: results.put(result), priority="duplicates")
+	runner.add(NautilusTMSUCommand("status", log_error=False), lambda command, result: results.put("background"), priority="background")
+	assert results.get(timeout=10) == "background"
+	release.set()
+	assert results.get(timeout=10) == "search"